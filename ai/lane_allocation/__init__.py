@@ -1,4 +1,4 @@
 from .core import MODULE_CONFIG, logger
-from .model import LaneAllocationGAT
+from .model import DenseLaneAllocationGAT, LaneAllocationGAT
 
-__all__ = ["MODULE_CONFIG", "logger", "LaneAllocationGAT"]
+__all__ = ["MODULE_CONFIG", "logger", "LaneAllocationGAT", "DenseLaneAllocationGAT"]
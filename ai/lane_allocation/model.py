@@ -9,7 +9,10 @@ from torch_geometric.nn import GATv2Conv
 
 from shared_src.inference import NUM_LANES
 
-from .core import logger
+from .core import MODULE_CONFIG, logger
+
+# Same default as the config, measured with test/lane_allocation/benchmark.py
+DENSE_THRESHOLD: int = MODULE_CONFIG.get("model", {}).get("dense_threshold", 16)
 
 
 class LaneAllocationGAT(torch.nn.Module):
@@ -68,8 +71,15 @@ class LaneAllocationGAT(torch.nn.Module):
         self,
         model_path: str | Path,
         device: Optional[torch.device] = None,
+        compiled: bool = False,
     ):
-        """Load the model for inference."""
+        """Load the model for inference.
+
+        Args:
+            model_path (str | Path): Path to the model checkpoint.
+            device (torch.device, optional): Device to load the model on.
+            compiled (bool): Whether to return a compiled model (see `compiled`).
+        """
         logger.debug(f"Loading model from '{model_path}'")
         device = device or self.device
         state_dict = torch.load(model_path, weights_only=True, map_location=device).get(
@@ -79,4 +89,93 @@ class LaneAllocationGAT(torch.nn.Module):
         self.device = device
         self.eval()
         logger.debug("Model loaded for inference.")
-        return self
+        return self.compiled() if compiled else self
+
+    def compiled(self, dynamic: bool = True, mode: Optional[str] = None):
+        """
+        Compile the model for inference with `torch.compile`.
+        The message passing of the GATv2 layers (attention, softmax and scatter
+        aggregation) is traced into a single graph and fused by the compiler, which
+        removes most of the per-call overhead on small graphs.
+
+        Args:
+            dynamic (bool): Whether to compile with dynamic shapes, so graphs with
+                different numbers of nodes and edges do not trigger recompilation.
+            mode (str, optional): The `torch.compile` mode.
+
+        Returns:
+            The compiled model. It shares its parameters with this model.
+        """
+        logger.debug(f"Compiling the model (dynamic={dynamic}, mode={mode})...")
+        self.eval()
+        return torch.compile(self, dynamic=dynamic, mode=mode)
+
+
+class DenseLaneAllocationGAT(LaneAllocationGAT):
+    """
+    LaneAllocationGAT with a dense forward path for small scenes.
+    Below `dense_threshold` nodes, the GATv2 layers are evaluated as masked attention
+    over an N x N adjacency matrix with batched matrix multiplications, which avoids
+    the per-call overhead of the scatter-based message passing. Larger graphs use the
+    sparse PyG path. The model shares its state dict with LaneAllocationGAT.
+    """
+
+    def __init__(
+        self,
+        input_dim: int,
+        hidden_dim: int,
+        output_dim: int = NUM_LANES,
+        heads: int = 2,
+        dense_threshold: int = DENSE_THRESHOLD,
+    ):
+        super().__init__(input_dim, hidden_dim, output_dim, heads)
+        self.dense_threshold = dense_threshold
+
+    def forward(self, x, edge_index, batch=None):
+        if x.size(0) <= self.dense_threshold:
+            return self.forward_dense(x, edge_index)
+        return super().forward(x, edge_index, batch)
+
+    def forward_dense(self, x: torch.Tensor, edge_index: torch.Tensor) -> torch.Tensor:
+        """Run the forward pass with dense masked attention."""
+        log_adjacency = self._log_adjacency(edge_index, x.size(0))
+        x = F.relu(self._dense_conv(self.input_layer, x, log_adjacency))
+        x = F.relu(self._dense_conv(self.hidden_layer_1, x, log_adjacency))
+        x = F.relu(self._dense_conv(self.hidden_layer_2, x, log_adjacency))
+        return self.output_layer(x)
+
+    @staticmethod
+    def _log_adjacency(edge_index: torch.Tensor, num_nodes: int) -> torch.Tensor:
+        """
+        Build the log-multiplicity matrix of the graph, with rows as targets and columns
+        as sources. Duplicate edges are counted like in the sparse softmax, self-loops
+        are replaced by exactly one per node like in GATv2Conv.
+        """
+        src, dst = edge_index
+        not_loop = src != dst
+        counts = torch.eye(num_nodes, dtype=torch.float32, device=edge_index.device)
+        counts.index_put_(
+            (dst[not_loop], src[not_loop]),
+            torch.ones_like(dst[not_loop], dtype=torch.float32),
+            accumulate=True,
+        )
+        return counts.log()  # Missing edges become -inf
+
+    @staticmethod
+    def _dense_conv(
+        conv: GATv2Conv, x: torch.Tensor, log_adjacency: torch.Tensor
+    ) -> torch.Tensor:
+        """Evaluate a GATv2Conv layer densely (concat heads, no edge features)."""
+        H, C = conv.heads, conv.out_channels
+        x_l = conv.lin_l(x).view(-1, H, C)
+        x_r = x_l if conv.share_weights else conv.lin_r(x).view(-1, H, C)
+
+        # Attention logits for every (target i, source j) pair: [N, N, H]
+        pairs = F.leaky_relu(x_r.unsqueeze(1) + x_l.unsqueeze(0), conv.negative_slope)
+        alpha = (pairs * conv.att).sum(dim=-1)
+        alpha = torch.softmax(alpha + log_adjacency.unsqueeze(-1), dim=1)
+
+        out = torch.einsum("ijh,jhc->ihc", alpha, x_l).reshape(-1, H * C)
+        if conv.bias is not None:
+            out = out + conv.bias
+        return out
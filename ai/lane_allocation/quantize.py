@@ -0,0 +1,202 @@
+import argparse
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from torch_geometric.data import Data
+from torch_geometric.loader import DataLoader
+
+from shared_src.data_preprocessing import (
+    DatasetSplit,
+    load_dataset_split,
+    unpack_dataset,
+)
+from shared_src.postprocessing import (
+    export_model_to_onnx,
+    optimize_onnx_model,
+    quantize_onnx_model,
+)
+
+from .core import MODULE_CONFIG, Config, logger
+from .model import LaneAllocationGAT
+from .train import ONNX_DYNAMIC_AXES, ONNX_INPUT_NAMES, ONNX_OUTPUT_NAMES
+
+DEVICE = torch.device("cpu")
+
+
+def _to_onnx_inputs(data: Data) -> dict[str, np.ndarray]:
+    """Convert a graph to the input feed of the ONNX model."""
+    return {
+        "x": data.x.detach().cpu().float().numpy(),
+        "edge_index": data.edge_index.detach().cpu().long().numpy(),
+    }
+
+
+def _evaluate_onnx(onnx_path: Path, dataset: list[Data]) -> tuple[float, float]:
+    """
+    Evaluate an ONNX model on the CPU.
+
+    Returns:
+        tuple[float, float]: The accuracy (in %) and the mean latency per graph (in ms).
+    """
+    session = ort.InferenceSession(
+        onnx_path.as_posix(), providers=["CPUExecutionProvider"]
+    )
+    correct_preds = 0
+    total_preds = 0
+    total_time = 0.0
+    for data in dataset:
+        feed = _to_onnx_inputs(data)
+        start = time.perf_counter()
+        (output,) = session.run(ONNX_OUTPUT_NAMES, feed)
+        total_time += time.perf_counter() - start
+
+        pred = output.argmax(axis=1)
+        correct_preds += int((pred == data.y.cpu().numpy()).sum())
+        total_preds += len(pred)
+
+    return (correct_preds / total_preds) * 100, total_time / len(dataset) * 1000
+
+
+def _benchmark_torch(model: LaneAllocationGAT, dataset: list[Data]) -> float:
+    """
+    Measure the mean latency per graph (in ms) of the eager FP32 model on the CPU.
+    """
+    total_time = 0.0
+    with torch.no_grad():
+        for data in dataset:
+            start = time.perf_counter()
+            model(data.x, data.edge_index)
+            total_time += time.perf_counter() - start
+
+    return total_time / len(dataset) * 1000
+
+
+def quantize(static: bool = False, num_calibration_graphs: int = 512) -> Path:
+    """
+    Quantize the lane allocation GAT to INT8 for CPU backends and write a report
+    comparing its accuracy and latency against the FP32 model.
+
+    Args:
+        static (bool): Whether to calibrate the activation ranges upfront (static
+            quantization) instead of quantizing them on the fly (dynamic quantization).
+        num_calibration_graphs (int): Number of training graphs used for calibration.
+    """
+    environment = MODULE_CONFIG.get("environment")
+    torch.manual_seed(environment.get("seed"))
+
+    dataset_config = MODULE_CONFIG.get("dataset", {})
+    dataset_path = unpack_dataset(Path(dataset_config.get("path")), "lane_allocation")
+
+    model_config = MODULE_CONFIG.get("model", {})
+    max_distance_cm = MODULE_CONFIG.get("vehicle", {}).get("max_distance_cm")
+
+    test_dataset = load_dataset_split(
+        dataset_path, DatasetSplit.TEST, DEVICE, max_distance_cm
+    )
+    num_features = test_dataset[0].x.shape[1]
+
+    model_dir = Path(
+        Config.get("global_assets_dir"), "trained_models", "lane_allocation"
+    )
+    model = LaneAllocationGAT(
+        input_dim=num_features,
+        hidden_dim=model_config.get("hidden_dim"),
+        heads=model_config.get("num_heads"),
+    ).inference(Path(model_dir, "lane_allocation.pt"), DEVICE)
+
+    onnx_path = Path(model_dir, "lane_allocation.onnx")
+    opt_path = onnx_path.with_suffix(".opt.onnx")
+    if not onnx_path.is_file():
+        export_model_to_onnx(
+            model,
+            save_path=onnx_path,
+            dummy_input=(test_dataset[0].x, test_dataset[0].edge_index.long()),
+            input_names=ONNX_INPUT_NAMES,
+            output_names=ONNX_OUTPUT_NAMES,
+            dynamic_axes=ONNX_DYNAMIC_AXES,
+        )
+        model.device = DEVICE
+        opt_path.unlink(missing_ok=True)  # Optimized from the previous export
+    if not opt_path.is_file():
+        optimize_onnx_model(onnx_path, sample_inputs=_to_onnx_inputs(test_dataset[0]))
+
+    calibration_data = None
+    if static:
+        train_dataset = load_dataset_split(
+            dataset_path, DatasetSplit.TRAIN, DEVICE, max_distance_cm
+        )
+        calibration_data = (
+            _to_onnx_inputs(data)
+            for data in islice(train_dataset, num_calibration_graphs)
+        )
+
+    # Quantize the offline-optimized graph, the CPU fallback prefers the INT8 model
+    int8_path = quantize_onnx_model(
+        opt_path,
+        save_path=onnx_path.with_suffix(".int8.onnx"),
+        calibration_data=calibration_data,
+    )
+
+    # Compare the quantized model against the FP32 model
+    logger.info("Evaluating the FP32 and INT8 models...")
+    test_loader = DataLoader(test_dataset, batch_size=model_config.get("batch_size"))
+    torch_accuracy = model.test(test_loader)
+    torch_latency = _benchmark_torch(model, test_dataset)
+    fp32_accuracy, fp32_latency = _evaluate_onnx(onnx_path, test_dataset)
+    int8_accuracy, int8_latency = _evaluate_onnx(int8_path, test_dataset)
+
+    report = {
+        "mode": "static" if static else "dynamic",
+        "num_test_graphs": len(test_dataset),
+        "accuracy": {
+            "torch_fp32": torch_accuracy,
+            "onnx_fp32": fp32_accuracy,
+            "onnx_int8": int8_accuracy,
+        },
+        "latency_ms": {
+            "torch_fp32": torch_latency,
+            "onnx_fp32": fp32_latency,
+            "onnx_int8": int8_latency,
+        },
+        "size_bytes": {
+            "onnx_fp32": onnx_path.stat().st_size,
+            "onnx_int8": int8_path.stat().st_size,
+        },
+    }
+    report_path = int8_path.with_suffix(".json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    logger.info(
+        f"Accuracy | Torch FP32: {torch_accuracy:.2f}% | ONNX FP32: {fp32_accuracy:.2f}% | ONNX INT8: {int8_accuracy:.2f}%"
+    )
+    logger.info(
+        f"Latency  | Torch FP32: {torch_latency:.3f} ms | ONNX FP32: {fp32_latency:.3f} ms | ONNX INT8: {int8_latency:.3f} ms"
+    )
+    logger.info(f"Quantization report saved to '{report_path}'")
+    return int8_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the lane allocation GAT")
+    parser.add_argument(
+        "-s",
+        "--static",
+        action="store_true",
+        help="Calibrate the activation ranges on the training split (static INT8)",
+    )
+    parser.add_argument(
+        "-n",
+        "--num_calibration_graphs",
+        type=int,
+        default=512,
+        help="Number of training graphs used for calibration (default: 512)",
+    )
+    args = parser.parse_args()
+
+    quantize(args.static, args.num_calibration_graphs)
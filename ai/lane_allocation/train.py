@@ -10,12 +10,20 @@ from shared_src.data_preprocessing import (
     unpack_dataset,
 )
 from shared_src.inference import MAX_VEHICLES_PER_LANE, NUM_LANES
-from shared_src.postprocessing import export_model_to_trt
+from shared_src.postprocessing import export_model_to_trt, optimize_onnx_model
 
 from .core import MODULE_CONFIG, Config, logger
 from .early_stopping import EarlyStopping
 from .model import LaneAllocationGAT
 
+ONNX_INPUT_NAMES: list[str] = ["x", "edge_index"]
+ONNX_OUTPUT_NAMES: list[str] = ["output"]
+ONNX_DYNAMIC_AXES: dict[str, dict[int, str]] = {
+    "x": {0: "num_nodes"},
+    "edge_index": {1: "num_edges"},
+    "output": {0: "num_nodes"},
+}
+
 
 def train():
     """Main function to train the GAT."""
@@ -171,22 +179,19 @@ def train():
         torch.randn(test_dataset[0].x.shape).to(device),
         test_dataset[0].edge_index.to(device).long(),
     )
+    onnx_path = Path(
+        Config.get("global_assets_dir"),
+        "trained_models",
+        "lane_allocation",
+        "lane_allocation.onnx",
+    )
     export_model_to_trt(
         model,
-        Path(
-            Config.get("global_assets_dir"),
-            "trained_models",
-            "lane_allocation",
-            "lane_allocation.onnx",
-        ),
+        onnx_path,
         dummy_input,
-        input_names=["x", "edge_index"],
-        output_names=["output"],
-        dynamic_axes={
-            "x": {0: "num_nodes"},
-            "edge_index": {1: "num_edges"},
-            "output": {0: "num_nodes"},
-        },
+        input_names=ONNX_INPUT_NAMES,
+        output_names=ONNX_OUTPUT_NAMES,
+        dynamic_axes=ONNX_DYNAMIC_AXES,
         shapes={
             "min_shapes": f"x:1x{num_features},edge_index:2x1",
             "opt_shapes": f"x:{MAX_VEHICLES_PER_LANE}x{num_features},edge_index:2x{MAX_VEHICLES_PER_LANE * 2}",
@@ -194,6 +199,15 @@ def train():
         },
     )
 
+    # Optimize the ONNX model offline for CPU backends
+    optimize_onnx_model(
+        onnx_path,
+        sample_inputs={
+            "x": test_dataset[0].x.cpu().numpy(),
+            "edge_index": test_dataset[0].edge_index.cpu().long().numpy(),
+        },
+    )
+
 
 if __name__ == "__main__":
     train()
@@ -1,32 +1,80 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
-import tensorrt as trt
 import torch
 
 from shared_src.common import python_to_trt_level
-from shared_src.inference import NUM_LANES
+from shared_src.inference import MAX_VEHICLES_PER_LANE, NUM_LANES
 
 from .core import logger
-from .pipeline import Model
+from .model import Model
+
+try:
+    import tensorrt as trt
+except ImportError:
+    trt = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+NUM_FEATURES: int = 4 + NUM_LANES
+# (num_nodes, num_edges) of the min/opt/max shape profiles the engine is built with
+SHAPE_PROFILES: tuple[tuple[int, int], ...] = (
+    (1, 1),
+    (MAX_VEHICLES_PER_LANE, MAX_VEHICLES_PER_LANE * 2),
+    (MAX_VEHICLES_PER_LANE**2, (MAX_VEHICLES_PER_LANE * 2) ** 2),
+)
 
 
 class GATInference(Model):
     """
     GATInference class for performing inference using a TensorRT engine.
     This class loads a TensorRT engine from a file and performs inference
-    on input data using the engine.
+    on input data using the engine. If an ONNX file is passed instead, the
+    model is executed on the CPU using ONNX Runtime.
     """
 
-    def __init__(self, model_path: Path, enable_host_code: bool = False):
+    def __init__(
+        self,
+        model_path: Path,
+        enable_host_code: bool = False,
+        return_logits: bool = False,
+        warmup: bool = True,
+    ):
         self.enable_host_code = enable_host_code
-        super().__init__(model_path)
+        self.return_logits = return_logits
+        self.context = None
+        self.engine = None
+        self.session = None
+        super().__init__(model_path, warmup=warmup)
+
+    @property
+    def uses_cpu(self) -> bool:
+        """Check whether the model is executed on the CPU."""
+        return self.session is not None
 
     def _load(self):
+        """
+        Load the model from the specified model path.
+        `.engine` files are loaded with TensorRT, `.onnx` files with ONNX Runtime on the CPU.
+        """
+        if self._model_path.suffix == ".onnx":
+            self._load_cpu()
+        else:
+            self._load_trt()
+
+    def _load_trt(self):
         """
         Load the TensorRT engine from the specified model path.
         This method initializes the TensorRT runtime and creates an execution context.
         """
+        if trt is None:
+            raise ImportError("TensorRT is required to load '.engine' models.")
+        if not torch.cuda.is_available():
+            raise RuntimeError("CUDA is required to run TensorRT engines.")
+
         trt_level = python_to_trt_level(logger.level)
         self.logger = trt.Logger(trt.Logger.INFO.__class__(trt_level))
         trt.init_libnvinfer_plugins(self.logger, "")
@@ -41,18 +89,50 @@ class GATInference(Model):
             )
 
         self.context = self.engine.create_execution_context()
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = torch.device("cuda")
+        # Each model owns a stream, so its work does not serialize with other models
+        self.stream = torch.cuda.Stream(device=self.device)
+
+    def _load_cpu(self):
+        """
+        Load the ONNX model from the specified model path into an ONNX Runtime session.
+        """
+        if ort is None:
+            raise ImportError("ONNX Runtime is required to load '.onnx' models.")
+
+        options = ort.SessionOptions()
+        if self._model_path.name.endswith(".opt.onnx"):
+            # The graph was already optimized offline, skip it at startup
+            options.graph_optimization_level = (
+                ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            )
+        self.session = ort.InferenceSession(
+            self._model_path.as_posix(), options, providers=["CPUExecutionProvider"]
+        )
+        self.device = torch.device("cpu")
+
+    def _warmup_inputs(self) -> Iterable[tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Generate random graphs for the min, opt and max shape profiles.
+        """
+        for num_nodes, num_edges in SHAPE_PROFILES:
+            x = torch.randn(num_nodes, NUM_FEATURES, device=self.device)
+            edge_index = torch.randint(
+                0, num_nodes, (2, num_edges), dtype=torch.long, device=self.device
+            )
+            yield x, edge_index
 
     def infer(self, *data: Any) -> torch.Tensor:
         """
-        Perform inference using the TensorRT engine.
+        Perform inference using the loaded model.
 
         Args:
             x (torch.Tensor): Input data of shape [num_nodes, num_features].
             edge_index (torch.Tensor): Edge index of shape [2, num_edges].
 
         Returns:
-            torch.Tensor: Output data from the model.
+            torch.Tensor: The optimal lane per node, or the logits of shape
+                [num_nodes, num_lanes] if return_logits is True.
         """
         if len(data) != 2:
             raise ValueError(
@@ -65,29 +145,56 @@ class GATInference(Model):
         # Check for empty input
         self._check_inputs(x, edge_index)
 
-        # Ensure tensors are on the correct device (GPU)
-        x_tensor = x.to(self.device, non_blocking=True)
-        edge_index_tensor = edge_index.to(self.device, non_blocking=True)
-        output_shape = (x_tensor.shape[0], NUM_LANES)
-        output_tensor = torch.empty(
-            output_shape, dtype=torch.float32, device=self.device
-        )
+        if self.uses_cpu:
+            output_tensor = self._infer_cpu(x, edge_index)
+        else:
+            output_tensor = self._infer_trt(x, edge_index)
+
+        if self.return_logits:
+            return output_tensor
+        return output_tensor.argmax(dim=1)
 
-        # Bindings: device pointers
-        bindings = [
-            x_tensor.data_ptr(),
-            edge_index_tensor.data_ptr(),
-            output_tensor.data_ptr(),
-        ]
+    def _infer_trt(self, x: torch.Tensor, edge_index: torch.Tensor) -> torch.Tensor:
+        """
+        Run the TensorRT engine on the stream of the model.
+        """
+        with torch.cuda.stream(self.stream):
+            # Ensure tensors are on the correct device (GPU)
+            x_tensor = x.to(self.device, non_blocking=True)
+            edge_index_tensor = edge_index.to(self.device, non_blocking=True)
+            output_shape = (x_tensor.shape[0], NUM_LANES)
+            output_tensor = torch.empty(
+                output_shape, dtype=torch.float32, device=self.device
+            )
 
-        # Set dynamic shapes
-        self.context.set_input_shape("x", x_tensor.shape)
-        self.context.set_input_shape("edge_index", edge_index_tensor.shape)
+            # Tensor addresses: device pointers
+            self.context.set_tensor_address("x", x_tensor.data_ptr())
+            self.context.set_tensor_address("edge_index", edge_index_tensor.data_ptr())
+            self.context.set_tensor_address("output", output_tensor.data_ptr())
 
-        self.context.execute_v2(bindings)
+            # Set dynamic shapes
+            self.context.set_input_shape("x", x_tensor.shape)
+            self.context.set_input_shape("edge_index", edge_index_tensor.shape)
+
+            self.context.execute_async_v3(self.stream.cuda_stream)
+
+        self.stream.synchronize()
 
         # Output is already a torch tensor on the correct device
-        return output_tensor.argmax(dim=1)
+        return output_tensor
+
+    def _infer_cpu(self, x: torch.Tensor, edge_index: torch.Tensor) -> torch.Tensor:
+        """
+        Run the ONNX model on the CPU.
+        """
+        (output,) = self.session.run(
+            ["output"],
+            {
+                "x": x.detach().cpu().float().numpy(),
+                "edge_index": edge_index.detach().cpu().long().numpy(),
+            },
+        )
+        return torch.from_numpy(output)
 
     @staticmethod
     def _check_inputs(x: torch.Tensor, edge_index: torch.Tensor) -> bool:
@@ -112,11 +219,13 @@ class GATInference(Model):
 
     def dispose(self):
         """
-        Dispose of the TensorRT context and engine.
+        Dispose of the TensorRT context and engine, or the ONNX Runtime session.
         """
         if self.context:
             del self.context
         if self.engine:
             del self.engine
+        if self.session:
+            del self.session
 
         logger.info("Model context and engine disposed.")
@@ -0,0 +1,157 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Optional, final
+
+from .core import logger
+
+
+class Model(ABC):
+    """
+    A base class for models used in the pipeline.
+    This class provides a common interface for all models.
+    """
+
+    def __init__(self, model_path: Path, warmup: bool = True):
+        self._loaded = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
+        self._submit_lock = threading.Lock()
+        self.dropped_requests = 0
+        self._model_path = model_path
+        self.time_to_ready = 0.0
+        if not self._model_path.is_file():
+            raise FileNotFoundError(f"Model file not found: {self._model_path}")
+
+        start = time.perf_counter()
+        self._load()
+        self._loaded = True
+        load_time = time.perf_counter() - start
+        logger.debug(f"Model loaded from {self._model_path}")
+
+        warmup_time = self.warmup() if warmup else 0.0
+        self.time_to_ready = load_time + warmup_time
+        logger.info(
+            f"{self.__class__.__name__} ready in {self.time_to_ready:.2f}s (load: {load_time:.2f}s, warm-up: {warmup_time:.2f}s)"
+        )
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Check if the model is loaded.
+        This property returns True if the model is successfully loaded, False otherwise.
+        """
+        return self._loaded
+
+    @property
+    def model_path(self) -> Path:
+        """
+        Get the path of the model file.
+        This property returns the path of the model file used to load the model.
+        """
+        return self._model_path
+
+    @final
+    def __call__(self, *data: Any):
+        """
+        Call the model with input data.
+        This method allows the model to be called like a function.
+        """
+        return self.infer(*data)
+
+    @final
+    def submit(self, *data: Any) -> Future:
+        """
+        Enqueue the input data for inference and return immediately.
+        Each model owns a single worker, so submitted requests are processed
+        in order and never run concurrently on the same model.
+        At most one request waits behind the running one. A request that has not
+        started yet is cancelled by the next one, so a slow model always works on
+        the latest input instead of falling further behind.
+
+        Returns:
+            Future: A future that resolves to the output of `infer`.
+        """
+        with self._submit_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix=f"{self.__class__.__name__}Worker",
+                )
+            if self._pending is not None and self._pending.cancel():
+                self.dropped_requests += 1
+            self._pending = self._executor.submit(self.infer, *data)
+            return self._pending
+
+    @final
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the inference worker of the model.
+        Pending requests are cancelled, the running one is awaited if `wait` is True.
+        """
+        with self._submit_lock:
+            if self._executor is None:
+                return
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            self._pending = None
+        logger.info(
+            f"{self.__class__.__name__} dropped {self.dropped_requests} stale requests"
+        )
+
+    @final
+    def warmup(self, iterations: int = 2) -> float:
+        """
+        Run synthetic inputs covering the shape profiles of the model, so lazy
+        initialization, kernel selection and memory pool growth happen before
+        the first real frame arrives.
+
+        Args:
+            iterations (int): Number of runs per synthetic input.
+
+        Returns:
+            float: The time the warm-up took in seconds.
+        """
+        start = time.perf_counter()
+        for data in self._warmup_inputs():
+            for _ in range(iterations):
+                self._warmup_step(*data)
+        return time.perf_counter() - start
+
+    def _warmup_inputs(self) -> Iterable[tuple[Any, ...]]:
+        """
+        Get the synthetic inputs used to warm up the model.
+        This method should be overridden by subclasses, the default performs no warm-up.
+        """
+        return ()
+
+    def _warmup_step(self, *data: Any):
+        """
+        Run a single warm-up step. Subclasses can override this method if `infer`
+        has side effects that should not be triggered by synthetic inputs.
+        """
+        self.infer(*data)
+
+    @abstractmethod
+    def _load(self):
+        """
+        Load the model from the specified path.
+        This method should be overridden by subclasses to implement specific loading logic.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def infer(self, *data: Any):
+        """
+        Perform inference on the input data.
+        This method should be overridden by subclasses to implement specific inference logic.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def dispose(self):
+        """
+        Dispose of the model resources.
+        This method should be overridden by subclasses to implement specific disposal logic.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
@@ -1,7 +1,6 @@
 import queue
-from abc import ABC, abstractmethod
-from pathlib import Path
-from typing import Any, final
+from concurrent.futures import Future
+from typing import Any, Optional
 
 import torch
 
@@ -9,93 +8,45 @@ from shared_src.common import Final, StoppableThread
 from shared_src.network.server_client import ServerClient
 
 from .core import logger
+from .model import Model
+from .switch_filter import LaneSwitchFilter
 from .yolo_inference import YOLOInference
 
 
-class Model(ABC):
-    """
-    A base class for models used in the pipeline.
-    This class provides a common interface for all models.
-    """
-
-    def __init__(self, model_path: Path):
-        self._loaded = False
-        self._model_path = model_path
-        if not self._model_path.is_file():
-            raise FileNotFoundError(f"Model file not found: {self._model_path}")
-
-        self._load()
-        self._loaded = True
-        logger.debug(f"Model loaded from {self._model_path}")
-
-    @property
-    def loaded(self) -> bool:
-        """
-        Check if the model is loaded.
-        This property returns True if the model is successfully loaded, False otherwise.
-        """
-        return self._loaded
-
-    @property
-    def model_path(self) -> Path:
-        """
-        Get the path of the model file.
-        This property returns the path of the model file used to load the model.
-        """
-        return self._model_path
-
-    @final
-    def __call__(self, *data: Any):
-        """
-        Call the model with input data.
-        This method allows the model to be called like a function.
-        """
-        return self.infer(data)
-
-    @abstractmethod
-    def _load(self):
-        """
-        Load the model from the specified path.
-        This method should be overridden by subclasses to implement specific loading logic.
-        """
-        raise NotImplementedError("Subclasses must implement this method")
-
-    def infer(self, *data: Any):
-        """
-        Perform inference on the input data.
-        This method should be overridden by subclasses to implement specific inference logic.
-        """
-        raise NotImplementedError("Subclasses must implement this method")
-
-    def dispose(self):
-        """
-        Dispose of the model resources.
-        This method should be overridden by subclasses to implement specific disposal logic.
-        """
-        raise NotImplementedError("Subclasses must implement this method")
-
-
 class ModelPipeline(StoppableThread, metaclass=Final):
     """
     A class that manages a pipeline of models for inference.
     This class allows for the sequential processing of data through multiple models.
+    The last model of the pipeline runs asynchronously on its own worker, so the
+    caller can continue with the next frame while the previous one is still processed.
     """
 
-    __pipeline_buffer: queue.Queue[torch.Tensor] = queue.Queue()
+    __pipeline_buffer: queue.Queue[tuple[int, tuple[int, ...], torch.Tensor]] = (
+        queue.Queue()
+    )
 
     def __init__(
-        self, models: list[Model], server: ServerClient, *args, **kwargs
+        self,
+        models: list[Model],
+        server: Optional[ServerClient] = None,
+        *args,
+        switch_filter: Optional[LaneSwitchFilter] = None,
+        **kwargs,
     ) -> None:
         super().__init__(*args, **kwargs)
         self._disposed = False
+        self._frame_seq = 0
         self.__models = models
         self._server = server
+        self._switch_filter = switch_filter or LaneSwitchFilter()
         if not self.__models:
             raise ValueError("Model list cannot be empty")
         if not all(isinstance(model, Model) for model in self.__models):
             raise TypeError("All models must be instances of the Model class")
 
-        logger.debug(f"Pipeline initialized with {len(self.__models)} models")
+        logger.info(
+            f"Pipeline initialized with {len(self.__models)} models, ready in {self.time_to_ready:.2f}s"
+        )
 
     @property
     def models(self) -> list[Model]:
@@ -105,6 +56,30 @@ class ModelPipeline(StoppableThread, metaclass=Final):
         """
         return self.__models
 
+    @property
+    def server(self) -> Optional[ServerClient]:
+        """
+        Get the channel the lane transitions are sent on, None while disconnected.
+        """
+        return self._server
+
+    @server.setter
+    def server(self, server: Optional[ServerClient]) -> None:
+        """
+        Attach the pipeline to a new channel, e.g. after a reconnect.
+        The models stay loaded, only the lane state is reset, since the peer starts
+        from a clean state as well.
+        """
+        self._server = server
+        self._switch_filter.reset()
+
+    @property
+    def time_to_ready(self) -> float:
+        """
+        Get the time it took to load and warm up all models of the pipeline in seconds.
+        """
+        return sum(model.time_to_ready for model in self.__models)
+
     def __call__(self, *data: Any):
         """
         Call the pipeline with input data.
@@ -112,28 +87,71 @@ class ModelPipeline(StoppableThread, metaclass=Final):
         """
         return self.input(*data)
 
-    def input(self, *data: Any):
+    def input(self, *data: Any) -> Optional[Future]:
         """
         Process the input data through the pipeline of models.
         This method is called when new data is available for inference.
-        """
-        for model in self.__models:
+        All models but the last one run synchronously, the last one is submitted
+        to its worker and its result is collected by the pipeline thread.
+        If the last model is still busy, a frame waiting for it is replaced by this one.
+
+        Returns:
+            Future: The future of the last model, or None if a stage produced no output.
+        """
+        *stages, last_model = self.__models
+        self._frame_seq += 1
+        frame_seq = self._frame_seq
+        vehicle_lanes: tuple[int, ...] = ()
+        for model in stages:
             output = model(*data)
-        self.__pipeline_buffer.put(output)
-        return output
+            if output is None:
+                return None
+            if isinstance(model, YOLOInference):
+                vehicle_lanes = model._last_infer_cache
+            data = output if isinstance(output, tuple) else (output,)
+
+        future = last_model.submit(*data)
+        future.add_done_callback(lambda f: self._collect(f, frame_seq, vehicle_lanes))
+        return future
+
+    def _collect(
+        self, future: Future, frame_seq: int, vehicle_lanes: tuple[int, ...]
+    ) -> None:
+        """
+        Put the result of a finished inference into the pipeline buffer.
+        Args:
+            future (Future): The finished future of the last model.
+            frame_seq (int): The sequence number of the frame the result belongs to.
+            vehicle_lanes (tuple[int, ...]): The lanes of the vehicles the result belongs to.
+        """
+        if future.cancelled():
+            return  # Replaced by a newer frame
+        if exception := future.exception():
+            logger.error(f"Pipeline inference failed: {exception}")
+            return
+        self.__pipeline_buffer.put((frame_seq, vehicle_lanes, future.result()))
 
     def run_with_exception_handling(self) -> None:
         try:
             while self.running:
-                if not self.__pipeline_buffer.empty():
-                    optimal_lane_ids = self.__pipeline_buffer.get()
-                    vehicle_lanes = YOLOInference._last_infer_cache
-                    from_to_map = zip(vehicle_lanes, optimal_lane_ids)
-                    for from_lane, to_lane in from_to_map:
-                        if from_lane != to_lane:
-                            self._server.send("switch", (from_lane, to_lane))
-
-                    self.__pipeline_buffer.task_done()
+                try:
+                    frame_seq, vehicle_lanes, output = self.__pipeline_buffer.get(
+                        timeout=0.1
+                    )
+                except queue.Empty:
+                    continue
+
+                # Only emit lane state changes, see LaneSwitchFilter
+                commands = self._switch_filter.update(
+                    torch.tensor(vehicle_lanes, dtype=torch.long), output
+                )
+                # All transitions of a frame are sent as one message,
+                # they are dropped while the channel is being rebuilt
+                server = self._server
+                if commands and server is not None:
+                    server.send("switch_batch", (frame_seq, commands))
+
+                self.__pipeline_buffer.task_done()
         except Exception as e:
             logger.error(f"Pipeline error: {e}")
             raise  # Propagate the error for reconnect logic
@@ -150,6 +168,8 @@ class ModelPipeline(StoppableThread, metaclass=Final):
             return
         self._disposed = True
         self.stop()
+        self._switch_filter.log_counters()
         for model in self.__models:
+            model.shutdown()
             model.dispose()
         logger.debug("Pipeline disposed")
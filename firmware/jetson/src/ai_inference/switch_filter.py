@@ -0,0 +1,111 @@
+import time
+from collections import Counter
+
+import torch
+
+from shared_src.inference import NUM_LANES
+
+from .core import logger
+
+
+class LaneSwitchFilter:
+    """
+    A decision layer between the lane allocation model and the switch commands.
+    It aggregates the per-vehicle predictions of a frame into one target per lane
+    and applies per-lane hysteresis, so only state changes are emitted:
+    - predictions below a confidence margin (top-1 minus top-2 probability) are ignored,
+    - a lane keeps its target for at least a minimum dwell time,
+    - targets that did not change are not sent again.
+    """
+
+    def __init__(
+        self,
+        num_lanes: int = NUM_LANES,
+        min_dwell_sec: float = 2.0,
+        min_confidence_margin: float = 0.2,
+    ) -> None:
+        """
+        Initialize the filter.
+        Args:
+            num_lanes (int): Number of lanes.
+            min_dwell_sec (float): Minimum time a lane keeps its target before it may change again.
+            min_confidence_margin (float): Minimum margin between the best and the second best
+                lane probability for a prediction to count.
+        """
+        self.num_lanes = num_lanes
+        self.min_dwell_sec = min_dwell_sec
+        self.min_confidence_margin = min_confidence_margin
+        # Target lane per lane, a lane targeting itself means "no switch"
+        self._targets = torch.arange(num_lanes)
+        self._last_change = torch.full((num_lanes,), float("-inf"), dtype=torch.float64)
+        self.counters: Counter[str] = Counter()
+
+    def reset(self) -> None:
+        """Reset the per-lane state, e.g. after a reconnect."""
+        self._targets = torch.arange(self.num_lanes)
+        self._last_change.fill_(float("-inf"))
+
+    def update(
+        self, vehicle_lanes: torch.Tensor, output: torch.Tensor
+    ) -> list[tuple[int, int]]:
+        """
+        Process the model output of a frame.
+        Args:
+            vehicle_lanes (torch.Tensor): Current lane of each vehicle, shape [num_vehicles].
+            output (torch.Tensor): Logits of shape [num_vehicles, num_lanes], or predicted
+                lanes of shape [num_vehicles] (treated as fully confident).
+        Returns:
+            list[tuple[int, int]]: The (from_lane, to_lane) commands to emit.
+        """
+        output = output.detach().cpu()
+        vehicle_lanes = vehicle_lanes.long().cpu()[: output.shape[0]]
+        output = output[: vehicle_lanes.shape[0]]
+
+        if output.ndim == 2:
+            probs = output.float().softmax(dim=1)
+            top = probs.topk(min(2, probs.shape[1]), dim=1).values
+            margin = top[:, 0] - (top[:, 1] if top.shape[1] > 1 else 0)
+            predicted_lanes = probs.argmax(dim=1)
+        else:
+            predicted_lanes = output.long()
+            margin = torch.ones_like(predicted_lanes, dtype=torch.float32)
+
+        valid = (vehicle_lanes >= 0) & (vehicle_lanes < self.num_lanes)
+        valid &= (predicted_lanes >= 0) & (predicted_lanes < self.num_lanes)
+        wants_switch = valid & (predicted_lanes != vehicle_lanes)
+        confident = wants_switch & (margin >= self.min_confidence_margin)
+        self.counters["suppressed_low_margin"] += int((wants_switch & ~confident).sum())
+
+        # Vote for a target per lane, weighted by confidence margin
+        votes = torch.zeros(self.num_lanes, self.num_lanes)
+        votes.index_put_(
+            (vehicle_lanes[confident], predicted_lanes[confident]),
+            margin[confident].float(),
+            accumulate=True,
+        )
+        best_votes, best_targets = votes.max(dim=1)
+        lanes = torch.arange(self.num_lanes)
+        desired = torch.where(best_votes > 0, best_targets, lanes)
+
+        now = time.monotonic()
+        changed = desired != self._targets
+        dwelled = (now - self._last_change) >= self.min_dwell_sec
+        emit = changed & dwelled
+
+        self.counters["suppressed_dwell"] += int((changed & ~dwelled).sum())
+        self.counters["suppressed_repeat"] += int((~changed & (desired != lanes)).sum())
+        self.counters["emitted"] += int(emit.sum())
+
+        self._targets = torch.where(emit, desired, self._targets)
+        self._last_change[emit] = now
+
+        from_lanes = lanes[emit].tolist()
+        to_lanes = desired[emit].tolist()
+        return list(zip(from_lanes, to_lanes))
+
+    def log_counters(self) -> None:
+        """Log the emitted and suppressed command counters."""
+        suppressed = sum(v for k, v in self.counters.items() if k != "emitted")
+        logger.info(
+            f"Switch commands: {self.counters['emitted']} emitted, {suppressed} suppressed ({dict(self.counters)})"
+        )
@@ -1,6 +1,6 @@
 import time
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import numpy as np
 import torch
@@ -10,10 +10,15 @@ from shared_src.common import Config
 from shared_src.data_preprocessing import BoxShape, box_to_polygon, build_edge_index
 from shared_src.inference import MODULE_CONFIG as VEHICLE_CONFIG
 from shared_src.inference import VehicleState
+from shared_src.inference.vehicle_state import CAMERA_RESOLUTION
 
 from .core import logger
 from .gat_inference import GATInference
-from .pipeline import Model
+from .model import Model
+
+# (width, height) of the frames used to warm up the model: the raw camera stream
+# and the cropped resolution the model was trained on
+WARMUP_FRAME_SIZES: tuple[tuple[int, int], ...] = ((1280, 720), CAMERA_RESOLUTION)
 
 
 class YOLOInference(Model):
@@ -33,6 +38,7 @@ class YOLOInference(Model):
         cleanup_interval: float = 5.0,
         cleanup_timeout: float = 10.0,
         return_tensors: bool = False,
+        warmup: bool = True,
     ):
         self.return_tensors = return_tensors
         self.confidence = confidence
@@ -43,7 +49,7 @@ class YOLOInference(Model):
         self.last_cleanup_time = time.time()
         self.vehicle_config = VEHICLE_CONFIG.get("vehicle", {})
         self._tensor_cache: dict[int, tuple[torch.Tensor, torch.Tensor]] = {}
-        super().__init__(model_path)
+        super().__init__(model_path, warmup=warmup)
 
     def _load(self):
         """
@@ -53,6 +59,21 @@ class YOLOInference(Model):
         self.model = YOLO(self.model_path, task="segment")
         self.model.eval()
 
+    def _warmup_inputs(self) -> Iterable[tuple[np.ndarray]]:
+        """
+        Generate blank frames for every warm-up frame size.
+        """
+        for width, height in WARMUP_FRAME_SIZES:
+            yield (np.zeros((height, width, 3), dtype=np.uint8),)
+
+    def _warmup_step(self, *data: Any):
+        """
+        Run a plain prediction, so the tracker and vehicle states stay untouched.
+        """
+        self.model.predict(
+            data[0], conf=self.confidence, project=self.cache_dir, verbose=False
+        )
+
     def clean_vehicle_states(self):
         current_time = time.time()
         if not current_time - self.last_cleanup_time > self.cleanup_interval:
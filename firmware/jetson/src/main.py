@@ -1,42 +1,42 @@
 import signal
+import time
 from pathlib import Path
+from typing import Optional
+
+import torch
 
 from firmware.jetson.src.ai_inference import GATInference, ModelPipeline, YOLOInference
 from shared_src.common import Config, StoppableThread, run_with_retry, stop_threads
-from shared_src.network import NETWORK_CONFIG, ServerClient, respond_to_broadcast
+from shared_src.network import (
+    NETWORK_CONFIG,
+    ChannelMode,
+    MetricsServer,
+    ServerClient,
+    WireFormat,
+    respond_to_broadcast,
+)
 
 from .network import GStreamerReceiver, logger
 
+# Time of the last network failure, used to measure how long the recovery takes
+_failed_at: Optional[float] = None
 
-def start_network(
-    zmq_port: int, gstreamer_port: int, nvidia_backend: bool = False
-) -> None:
+
+def load_pipeline() -> ModelPipeline:
     """
-    Start the network components.
-    Args:
-        zmq_port (int): The port for the ZeroMQ server.
-        gstreamer_port (int): The port for the GStreamer server.
-        nvidia_backend (bool): Flag to use NVIDIA backend for GStreamer.
+    Load the models and start the model pipeline.
+    The pipeline lives for the whole process, so network failures do not reload the models.
     """
-    logger.info("Starting network components...")
-    peer_ip = respond_to_broadcast(port=gstreamer_port, stop_on_response=True)
-    if peer_ip is None:
-        logger.error("No peer found, exiting.")
-        raise RuntimeError("No peer found")
-
-    server_thread = ServerClient(
-        zmq_port, is_server=False, server_ip=peer_ip, daemon=True
-    )
-    server_thread.start()
-
-    decoder = "nvh264dec" if nvidia_backend else "avdec_h264"
-    gstreamer_thread = GStreamerReceiver(
-        f'srtsrc uri="srt://0.0.0.0:{gstreamer_port}?mode=listener&latency=1" ! queue ! tsdemux ! h264parse ! {decoder} ! videoconvert ! appsink sync=false',
-        daemon=True,
-    )
-    gstreamer_thread.start()
-
     model_paths = Path(Config.get("ROOT_DIR"), "models")
+    # Fall back to the ONNX model on the CPU if no CUDA device is available,
+    # preferably the INT8-quantized or the offline-optimized one
+    gat_path = Path(model_paths, "lane_allocation", "lane_allocation.engine")
+    if not torch.cuda.is_available():
+        for suffix in (".int8.onnx", ".opt.onnx", ".onnx"):
+            candidate = gat_path.with_suffix(suffix)
+            if candidate.is_file():
+                break
+        gat_path = candidate
     pipeline = ModelPipeline(
         models=[
             YOLOInference(
@@ -44,30 +44,111 @@ def start_network(
                 return_tensors=True,
             ),
             GATInference(
-                Path(model_paths, "lane_allocation", "lane_allocation.engine"),
+                gat_path,
                 enable_host_code=True,
+                return_logits=True,
             ),
         ],
-        server=server_thread,
+        daemon=True,
     )
+    pipeline.start()
+    return pipeline
+
+
+def start_network(
+    pipeline: ModelPipeline,
+    zmq_port: int,
+    gstreamer_port: int,
+    nvidia_backend: bool = False,
+    metrics_server: Optional[MetricsServer] = None,
+) -> None:
+    """
+    Start the network components and attach them to the running pipeline.
+    Only these components are rebuilt when the connection to the peer fails.
+    Args:
+        pipeline (ModelPipeline): The long-lived model pipeline.
+        zmq_port (int): The port for the ZeroMQ server.
+        gstreamer_port (int): The port for the GStreamer server.
+        nvidia_backend (bool): Flag to use NVIDIA backend for GStreamer.
+        metrics_server (MetricsServer, optional): The server to publish the link metrics on.
+    """
+    global _failed_at
+    if not pipeline.is_alive():
+        logger.error("Model pipeline is not running, exiting.")
+        raise RuntimeError("Model pipeline is not running")
+
+    logger.info("Starting network components...")
+    try:
+        peer_ip = respond_to_broadcast(port=gstreamer_port, stop_on_response=True)
+        if peer_ip is None:
+            logger.error("No peer found, exiting.")
+            raise RuntimeError("No peer found")
+
+        # Commands are sent without waiting on the Pi, acknowledgements arrive asynchronously
+        server_thread = ServerClient(
+            zmq_port,
+            is_server=False,
+            server_ip=peer_ip,
+            mode=ChannelMode(NETWORK_CONFIG["vars"]["zmq_mode"]),
+            acks=NETWORK_CONFIG["vars"]["zmq_acks"],
+            wire_format=WireFormat(NETWORK_CONFIG["vars"]["zmq_wire_format"]),
+            daemon=True,
+        )
+        server_thread.start()
+
+        decoder = "nvh264dec" if nvidia_backend else "avdec_h264"
+        gstreamer_thread = GStreamerReceiver(
+            f'srtsrc uri="srt://0.0.0.0:{gstreamer_port}?mode=listener&latency=1" ! queue ! tsdemux ! h264parse ! {decoder} ! videoconvert ! appsink sync=false',
+            daemon=True,
+        )
+        gstreamer_thread.start()
+    except Exception:
+        _failed_at = _failed_at or time.perf_counter()
+        raise
+
+    pipeline.server = server_thread
     gstreamer_thread.add_listener(pipeline)
+    if metrics_server is not None:
+        metrics_server.register("zmq", server_thread.metrics.snapshot)
+    if _failed_at is not None:
+        logger.info(
+            f"Recovered from network failure in {time.perf_counter() - _failed_at:.2f}s (models kept loaded)"
+        )
+        _failed_at = None
 
     threads: tuple[StoppableThread, ...] = (server_thread, gstreamer_thread)
     signal.signal(signal.SIGTERM, lambda _, __: stop_threads(threads))
     gstreamer_thread.join()
-    pipeline.dispose()
+    pipeline.server = None
     stop_threads(threads)
 
     # After joining, check for exceptions
     for t in threads:
         if t.exception:
+            _failed_at = time.perf_counter()
             raise t.exception
 
 
 if __name__ == "__main__":
-    run_with_retry(
-        start_network,
-        NETWORK_CONFIG["ports"].get("zmq"),
-        NETWORK_CONFIG["ports"].get("gstreamer"),
-        NETWORK_CONFIG["vars"].get("cudacodec_enabled"),
-    )
+    pipeline = load_pipeline()
+
+    metrics_server = None
+    if metrics_port := NETWORK_CONFIG["ports"].get("metrics"):
+        # Serve the link metrics on the local host, e.g. for `curl localhost:<port>/metrics`
+        metrics_server = MetricsServer(metrics_port, daemon=True)
+        metrics_server.start()
+
+    try:
+        run_with_retry(
+            start_network,
+            pipeline,
+            NETWORK_CONFIG["ports"].get("zmq"),
+            NETWORK_CONFIG["ports"].get("gstreamer"),
+            NETWORK_CONFIG["vars"].get("cudacodec_enabled"),
+            metrics_server,
+            retry_delay_sec=1,
+        )
+    finally:
+        if metrics_server is not None:
+            stop_threads((metrics_server,))
+        pipeline.dispose()
@@ -12,14 +12,14 @@ class GStreamerReceiver(StoppableThread):
     A class that receives GStreamer data and provides a generator for frames.
     """
 
-    __listeners: list[Callable] = []
-
     def __init__(self, pipeline: str, *args, **kwargs) -> None:
         """Initialize the GStreamer receiver.
         Args:
             pipeline (str): The GStreamer pipeline to use.
         """
         super().__init__(*args, **kwargs)
+        # Per instance, so a receiver rebuilt after a failure starts without stale listeners
+        self.__listeners: list[Callable] = []
         self._pipeline = pipeline
         timeout = kwargs.get("timeout", 3000)
         self._cap = cv2.VideoCapture()
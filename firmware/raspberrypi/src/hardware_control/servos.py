@@ -1,14 +1,49 @@
-from typing import Any
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Iterable, NamedTuple, Optional
 
 from dynamixel_sdk import *
 
 from shared_src.common import StoppableThread
+from shared_src.network.metrics import LatencyHistogram
 
 from .core import MODULE_CONFIG, logger
 
-#! IMPORTANT: This is currently only implemented for the Dynamixel XL320 servos.
-#! If you want to use other servos, you need to look up the amount of bytes each register
-#! takes and implement the read/write functions accordingly besides changing the type in the config file.
+
+class _RegisterMap(NamedTuple):
+    """The registers of a servo model, resolved once from the config."""
+
+    torque_enable: tuple[int, int]  # (address, num_bytes)
+    goal_position: tuple[int, int]
+    present_position: tuple[int, int]
+    min_position: int
+    position_scale: float  # Position units per degree
+
+
+@lru_cache(maxsize=None)
+def _register_map(type: str) -> _RegisterMap:
+    """Compile the register map of a servo model."""
+    config = MODULE_CONFIG.get("dynamixel", {}).get(type, {})
+    min_position = config.get("DXL_MINIMUM_POSITION_VALUE")
+    max_position = config.get("DXL_MAXIMUM_POSITION_VALUE")
+    return _RegisterMap(
+        torque_enable=(
+            config.get("ADDR_TORQUE_ENABLE"),
+            config.get("LEN_TORQUE_ENABLE", 1),
+        ),
+        goal_position=(
+            config.get("ADDR_GOAL_POSITION"),
+            config.get("LEN_GOAL_POSITION", 2),
+        ),
+        present_position=(
+            config.get("ADDR_PRESENT_POSITION"),
+            config.get("LEN_PRESENT_POSITION", 2),
+        ),
+        min_position=min_position,
+        position_scale=(max_position - min_position) / 360,
+    )
 
 
 class _Servo:
@@ -17,109 +52,162 @@ class _Servo:
         self.type = type
         self.portHandler = porthandler
         self.packetHandler = packetHandler
-        self._config = MODULE_CONFIG.get("dynamixel", {}).get(type, {})
-
-        self.set_angle(0)
-
-    def _write(self, num_bytes: int, address: int, value: int) -> bool:
-        """Write a value to the servo."""
-        func_map = {
+        self.registers = _register_map(type)
+        self._torque_verify_interval = MODULE_CONFIG.get("servos", {}).get(
+            "torque_verify_interval", 5.0
+        )
+        # Locally tracked register state, None while unknown
+        self._torque_enabled: Optional[bool] = None
+        self._torque_verified_at = 0.0
+        self.goal: Optional[int] = None
+        self._write_funcs = {
             1: self.packetHandler.write1ByteTxRx,
             2: self.packetHandler.write2ByteTxRx,
             4: self.packetHandler.write4ByteTxRx,
         }
+        self._read_funcs = {
+            1: self.packetHandler.read1ByteTxRx,
+            2: self.packetHandler.read2ByteTxRx,
+            4: self.packetHandler.read4ByteTxRx,
+        }
 
-        if num_bytes in func_map:
-            func = func_map[num_bytes]
-            result, error = func(self.portHandler, self.id, address, value)
-            if result != COMM_SUCCESS:
-                logger.error(
-                    f"Failed to write {num_bytes} bytes: {self.packetHandler.getTxRxResult(result)}"
-                )
-                return False
-            elif error != 0:
-                logger.error(
-                    f"Error writing {num_bytes} bytes: {self.packetHandler.getRxPacketError(error)}"
-                )
-                return False
-        else:
+        self.set_angle(0)
+
+    def _write(self, num_bytes: int, address: int, value: int) -> bool:
+        """Write a value to the servo."""
+        func = self._write_funcs.get(num_bytes)
+        if func is None:
             logger.error(f"Invalid number of bytes: {num_bytes}")
             return False
 
+        result, error = func(self.portHandler, self.id, address, value)
+        if result != COMM_SUCCESS:
+            logger.error(
+                f"Failed to write {num_bytes} bytes: {self.packetHandler.getTxRxResult(result)}"
+            )
+            return False
+        elif error != 0:
+            logger.error(
+                f"Error writing {num_bytes} bytes: {self.packetHandler.getRxPacketError(error)}"
+            )
+            return False
+
         return True
 
     def _read(self, num_bytes: int, address: int) -> int:
         """Read a value from the servo."""
-        func_map = {
-            1: self.packetHandler.read1ByteTxRx,
-            2: self.packetHandler.read2ByteTxRx,
-            4: self.packetHandler.read4ByteTxRx,
-        }
-
-        if num_bytes in func_map:
-            func = func_map[num_bytes]
-            result, error = func(self.portHandler, self.id, address)
-            if result != COMM_SUCCESS:
-                logger.error(
-                    f"Failed to read {num_bytes} bytes: {self.packetHandler.getTxRxResult(result)}"
-                )
-                return -1
-            elif error != 0:
-                logger.error(
-                    f"Error reading {num_bytes} bytes: {self.packetHandler.getRxPacketError(error)}"
-                )
-                return -1
-        else:
+        func = self._read_funcs.get(num_bytes)
+        if func is None:
             logger.error(f"Invalid number of bytes: {num_bytes}")
             return -1
 
-        return result
+        value, result, error = func(self.portHandler, self.id, address)
+        if result != COMM_SUCCESS:
+            logger.error(
+                f"Failed to read {num_bytes} bytes: {self.packetHandler.getTxRxResult(result)}"
+            )
+            return -1
+        elif error != 0:
+            logger.error(
+                f"Error reading {num_bytes} bytes: {self.packetHandler.getRxPacketError(error)}"
+            )
+            return -1
+
+        return value
 
     def _toggle_torque(self, enable: bool) -> bool:
-        return self._write(1, self._config.get("ADDR_TORQUE_ENABLE"), int(enable))
+        address, num_bytes = self.registers.torque_enable
+        if not self._write(num_bytes, address, int(enable)):
+            self._torque_enabled = None
+            return False
+        self.torque_written(enable)
+        return True
+
+    def torque_written(self, enable: bool) -> None:
+        """Record that the torque was written, e.g. by a group write."""
+        self._torque_enabled = enable
+        self._torque_verified_at = time.monotonic()
+        if not enable:
+            self.goal = None  # The servo may be moved by hand while it is limp
+
+    @property
+    def needs_torque_enable(self) -> bool:
+        """
+        Check whether the torque has to be enabled before a move.
+        The cached state is verified on the bus once it is older than the verify interval,
+        since the servo disables the torque by itself on errors such as an overload.
+        """
+        if (
+            self._torque_enabled
+            and time.monotonic() - self._torque_verified_at
+            > self._torque_verify_interval
+        ):
+            address, num_bytes = self.registers.torque_enable
+            enabled = self._read(num_bytes, address)
+            self._torque_enabled = enabled == 1 if enabled != -1 else None
+            self._torque_verified_at = time.monotonic()
+            if not self._torque_enabled:
+                logger.warning(f"Servo {self.id} lost its torque, re-enabling it.")
+                self.goal = None
+        return not self._torque_enabled
 
     @property
     def angle(self) -> int:
         """Get the current angle of the servo."""
-        result = self._read(2, self._config.get("ADDR_PRESENT_POSITION"))
+        address, num_bytes = self.registers.present_position
+        result = self._read(num_bytes, address)
         if result == -1:
             logger.error("Failed to read angle.")
             return -1
+        if self.registers.min_position < 0 and result >= 1 << (8 * num_bytes - 1):
+            result -= 1 << (
+                8 * num_bytes
+            )  # Signed positions are read as two's complement
 
         return int(
-            (result - self._config.get("DXL_MINIMUM_POSITION_VALUE"))
-            * 360
-            / (
-                self._config.get("DXL_MAXIMUM_POSITION_VALUE")
-                - self._config.get("DXL_MINIMUM_POSITION_VALUE")
-            )
+            (result - self.registers.min_position) / self.registers.position_scale
         )
 
+    def goal_position(self, angle: int) -> Optional[int]:
+        """Convert an angle to the goal position register value, None if it is out of range."""
+        if not 0 <= angle <= 360:
+            logger.error("Angle must be between 0 and 360 degrees.")
+            return None
+
+        return int(angle * self.registers.position_scale)
+
     def set_angle(self, angle: int):
-        result = self._toggle_torque(True)
-        if not result:
-            logger.error("Failed to enable torque.")
+        position = self.goal_position(angle)
+        if position is None:
             return
 
-        if not 0 <= angle <= 360:
-            logger.error("Angle must be between 0 and 360 degrees.")
+        if self.needs_torque_enable and not self._toggle_torque(True):
+            logger.error("Failed to enable torque.")
             return
 
-        self._write(
-            2,
-            self._config.get("ADDR_GOAL_POSITION"),
-            int(
-                angle
-                * (
-                    self._config.get("DXL_MAXIMUM_POSITION_VALUE")
-                    - self._config.get("DXL_MINIMUM_POSITION_VALUE")
-                )
-                / 360
-            ),
-        )
+        if position == self.goal:
+            return  # Already there, nothing to write
+        address, num_bytes = self.registers.goal_position
+        if self._write(num_bytes, address, position):
+            self.goal = position
+
+
+def _to_bytes(value: int, num_bytes: int) -> list[int]:
+    """Split a register value into little-endian bytes, negative values in two's complement."""
+    return list((value & ((1 << (8 * num_bytes)) - 1)).to_bytes(num_bytes, "little"))
 
 
 class ServoManager(StoppableThread):
+    """
+    A thread that owns the servo bus. Commands are queued by `on_event` and written by
+    this thread, so the caller never waits on the UART. Pending goals are coalesced per
+    servo, only the latest one is written, and safety commands such as a torque-off
+    are executed before any pending move.
+    """
+
+    # Safety commands, in the order they are executed
+    SAFETY_COMMANDS: tuple[str, ...] = ("torque_off", "exit")
+
     def __init__(
         self,
         *args,
@@ -137,6 +225,14 @@ class ServoManager(StoppableThread):
         self.packetHandler = PacketHandler(2.0)
         self.reverse_direction = reverse_direction
         self.servos = {}
+        self._bus_lock = threading.Lock()
+        self._work_ready = threading.Condition()
+        self._pending_goals: dict[int, tuple[float, int]] = {}
+        self._pending_safety: set[str] = set()
+        self._closed = False
+        self.counters: Counter[str] = Counter()
+        self.queue_wait = LatencyHistogram("servo queue wait")
+        self.bus_time = LatencyHistogram("servo bus time")
 
         if not self.portHandler.openPort():
             logger.error("Failed to open the port")
@@ -164,11 +260,200 @@ class ServoManager(StoppableThread):
         if id in self.servos:
             del self.servos[id]
 
+    def _group_write(self, writes: list[tuple[int, int, int, int]]) -> bool:
+        """
+        Write registers of several servos in a single instruction packet, without waiting
+        for status packets. Servos sharing the register use a sync write, mixed models a bulk write.
+        Args:
+            writes (list[tuple[int, int, int, int]]): The (id, address, num_bytes, value) writes.
+        Returns:
+            bool: True if the packet was sent.
+        """
+        if not writes:
+            return True
+        layouts = {(address, num_bytes) for _, address, num_bytes, _ in writes}
+        if len(layouts) == 1:
+            address, num_bytes = layouts.pop()
+            group = GroupSyncWrite(
+                self.portHandler, self.packetHandler, address, num_bytes
+            )
+            for id, _, _, value in writes:
+                group.addParam(id, _to_bytes(value, num_bytes))
+        else:
+            group = GroupBulkWrite(self.portHandler, self.packetHandler)
+            for id, address, num_bytes, value in writes:
+                group.addParam(id, address, num_bytes, _to_bytes(value, num_bytes))
+
+        result = group.txPacket()
+        group.clearParam()
+        if result != COMM_SUCCESS:
+            logger.error(
+                f"Failed to write {len(writes)} servos: {self.packetHandler.getTxRxResult(result)}"
+            )
+            return False
+        return True
+
+    def set_angles(self, goal_angles: dict[int, int]) -> bool:
+        """
+        Move several servos at once, with one packet for the torque and one for the goal positions,
+        regardless of the number of servos.
+        Args:
+            goal_angles (dict[int, int]): The goal angle per servo ID.
+        Returns:
+            bool: True if both packets were sent.
+        """
+        torque_writes: list[tuple[int, int, int, int]] = []
+        goal_writes: list[tuple[int, int, int, int]] = []
+        with self._bus_lock:
+            for id, angle in goal_angles.items():
+                servo = self.servos[id]
+                position = servo.goal_position(angle)
+                if position is None:
+                    continue
+                if servo.needs_torque_enable:
+                    torque_writes.append((id, *servo.registers.torque_enable, 1))
+                # Servos that hold the goal already are left out of the packet
+                if position != servo.goal:
+                    goal_writes.append((id, *servo.registers.goal_position, position))
+
+            if not self._group_write(torque_writes):
+                logger.error("Failed to enable torque.")
+                return False
+            for id, *_ in torque_writes:
+                self.servos[id].torque_written(True)
+            if not self._group_write(goal_writes):
+                return False
+            for id, *_, position in goal_writes:
+                self.servos[id].goal = position
+            return True
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of pending goals and safety commands."""
+        with self._work_ready:
+            return len(self._pending_goals) + len(self._pending_safety)
+
+    def run_with_exception_handling(self) -> None:
+        try:
+            while self.running:
+                with self._work_ready:
+                    self._work_ready.wait_for(
+                        lambda: self._pending_goals
+                        or self._pending_safety
+                        or not self.running,
+                        timeout=1.0,
+                    )
+                    safety = [
+                        c for c in self.SAFETY_COMMANDS if c in self._pending_safety
+                    ]
+                    self._pending_safety.clear()
+                    goals, self._pending_goals = self._pending_goals, {}
+
+                if safety:
+                    # Moves queued before a safety command were discarded on submission
+                    self._run_safety(safety)
+                if goals and self.running:
+                    self._run_goals(goals)
+        except Exception as e:
+            logger.error(f"ServoManager encountered an error: {e}")
+            raise  # Propagate error for reconnect logic
+        finally:
+            self._close()
+
+    def _run_safety(self, commands: list[str]) -> None:
+        """Execute safety commands on the bus."""
+        logger.info(f"Executing safety commands: {', '.join(commands)}")
+        start = time.perf_counter()
+        self.torque_off_all()
+        self.bus_time.record(time.perf_counter() - start)
+        self.counters["safety_commands"] += len(commands)
+        if "exit" in commands:
+            self.stop()
+
+    def _run_goals(self, goals: dict[int, tuple[float, int]]) -> None:
+        """Write the coalesced goals of all servos in one pass."""
+        start = time.perf_counter()
+        for queued_at, _ in goals.values():
+            self.queue_wait.record(start - queued_at)
+        self.set_angles({id: angle for id, (_, angle) in goals.items()})
+        self.bus_time.record(time.perf_counter() - start)
+        self.counters["bus_writes"] += 1
+
+    def submit_angles(self, goal_angles: dict[int, int]) -> None:
+        """
+        Queue goal angles for the serial worker. This never blocks on the bus.
+        A pending goal of the same servo is replaced, since only the latest one matters.
+        Args:
+            goal_angles (dict[int, int]): The goal angle per servo ID.
+        """
+        queued_at = time.perf_counter()
+        with self._work_ready:
+            for id, angle in goal_angles.items():
+                if id in self._pending_goals:
+                    self.counters["coalesced"] += 1
+                self._pending_goals[id] = (queued_at, angle)
+            self.counters["goals"] += len(goal_angles)
+            self._work_ready.notify()
+
+    def submit_safety(self, command: str) -> None:
+        """
+        Queue a safety command, which is executed before any pending move
+        and discards the pending moves.
+        Args:
+            command (str): One of `SAFETY_COMMANDS`.
+        """
+        if command not in self.SAFETY_COMMANDS:
+            raise ValueError(f"Unknown safety command: {command}")
+        with self._work_ready:
+            self._pending_safety.add(command)
+            self._pending_goals.clear()
+            self._work_ready.notify()
+
+    def torque_off_all(self) -> bool:
+        """Disable the torque of all servos in one packet."""
+        with self._bus_lock:
+            writes = [
+                (id, *servo.registers.torque_enable, 0)
+                for id, servo in self.servos.items()
+            ]
+            if not self._group_write(writes):
+                logger.error("Failed to disable torque.")
+                return False
+            for servo in self.servos.values():
+                servo.torque_written(False)
+            return True
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the queue and bus metrics, e.g. for the `MetricsServer`."""
+        return {
+            "queue_depth": self.queue_depth,
+            "counters": dict(self.counters),
+            "latency": {h.name: h.snapshot() for h in (self.queue_wait, self.bus_time)},
+        }
+
     def dispose(self):
+        """Stop the serial worker, which disables the torque and closes the port.
+        If the worker is not running, this is done on the calling thread.
+        """
         self.stop()
-        for servo in self.servos.values():
-            servo._toggle_torque(False)
+        with self._work_ready:
+            self._work_ready.notify()
+        if self.is_alive() and threading.current_thread() is not self:
+            return
+        self._close()
+
+    def _close(self) -> None:
+        """Disable the torque of all servos and close the port."""
+        with self._bus_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.torque_off_all()
         self.portHandler.closePort()
+        logger.info(
+            f"ServoManager closed: {dict(self.counters)} | "
+            f"{self.queue_wait.summary()} | {self.bus_time.summary()}"
+        )
 
     def broadcast_add(self):
         """Broadcast the servo IDs to the network."""
@@ -204,44 +489,62 @@ class ServoManager(StoppableThread):
     def on_event(self, command: str, value: Any):
         """Handle incoming commands from the server."""
         logger.debug(f"Received command: {command} with value: {value}")
-        turning_degree = self._lane_config.get("turning_degree", 0)
 
         match command:
             case "exit":
                 logger.info("Exit command received, disposing servos...")
-                self.dispose()
+                self.submit_safety("exit")
             case "switch":
-                #! We suppose that the servos are connected in the same order as the lanes, e.g. lane 0 => servo 0
-                #! and that that the lanes are numbered from 0 to n-1 from left to right
-                #! This makes it easier to manage the servos
-
-                from_lane, to_lane = value
-                if from_lane < 0 or to_lane < 0:
-                    logger.error(
-                        f"Invalid lane mapping: Lanes {from_lane} or {to_lane} not found"
-                    )
-                    return
+                self.apply_transitions([value])
+            case "switch_batch":
+                frame_seq, transitions = value
+                logger.debug(
+                    f"Applying {len(transitions)} transitions of frame {frame_seq}"
+                )
+                self.apply_transitions(transitions)
+            case _:
+                return
 
-                if from_lane == to_lane:
-                    logger.info(f"Already on lane {from_lane}, no action taken.")
-                    return
+    def apply_transitions(self, transitions: Iterable[tuple[int, int]]) -> None:
+        """
+        Apply the lane transitions of a frame in one pass over the servo bus.
+        If a servo is part of several transitions, the last one wins.
+        Args:
+            transitions (Iterable[tuple[int, int]]): The (from_lane, to_lane) pairs.
+        """
+        #! We suppose that the servos are connected in the same order as the lanes, e.g. lane 0 => servo 0
+        #! and that that the lanes are numbered from 0 to n-1 from left to right
+        #! This makes it easier to manage the servos
+        turning_degree = self._lane_config.get("turning_degree", 0)
+        goal_angles: dict[int, int] = {}
 
-                from_servo = self.servos.get(from_lane)
-                to_servo = self.servos.get(to_lane)
-                if from_servo is None or to_servo is None:
-                    logger.error(
-                        f"Invalid servo mapping: {from_servo} or {to_servo} not found"
-                    )
-                    return
+        for from_lane, to_lane in transitions:
+            if from_lane < 0 or to_lane < 0:
+                logger.error(
+                    f"Invalid lane mapping: Lanes {from_lane} or {to_lane} not found"
+                )
+                continue
+
+            if from_lane == to_lane:
+                logger.info(f"Already on lane {from_lane}, no action taken.")
+                continue
 
-                angle = (
-                    180 + turning_degree
-                    if ((from_lane < to_lane) ^ self.reverse_direction)
-                    else 180 - turning_degree
+            if from_lane not in self.servos or to_lane not in self.servos:
+                logger.error(
+                    f"Invalid servo mapping: {self.servos.get(from_lane)} or {self.servos.get(to_lane)} not found"
                 )
-                from_servo.set_angle(angle)
-                to_servo.set_angle(angle)
-                logger.debug(f"Setting angle for {from_lane} to {angle}")
-                logger.info(f"Switching from lane {from_lane} to lane {to_lane}")
-            case _:
-                return
+                continue
+
+            angle = (
+                180 + turning_degree
+                if ((from_lane < to_lane) ^ self.reverse_direction)
+                else 180 - turning_degree
+            )
+            goal_angles[from_lane] = angle
+            goal_angles[to_lane] = angle
+            logger.info(f"Switching from lane {from_lane} to lane {to_lane}")
+
+        if not goal_angles:
+            return
+        logger.debug(f"Queueing angles {goal_angles}")
+        self.submit_angles(goal_angles)
@@ -1,10 +1,18 @@
 import signal
 
 from shared_src.common import StoppableThread, run_with_retry, stop_threads
-from shared_src.network import NETWORK_CONFIG, ServerClient, discover_peer
+from shared_src.network import (
+    NETWORK_CONFIG,
+    ChannelMode,
+    MetricsServer,
+    ServerClient,
+    WireFormat,
+    discover_peer,
+)
 
 from .hardware_control import ServoManager
-from .network import DisplayServer, GStreamerSender, logger
+from .network import AsyncDisplayServer, DisplayServer, GStreamerSender, logger
+from .network.core import MODULE_CONFIG as NETWORK_MODULE_CONFIG
 
 
 def start_network(zmq_port: int, gstreamer_port: int, display_server_port: int) -> None:
@@ -16,12 +24,17 @@ def start_network(zmq_port: int, gstreamer_port: int, display_server_port: int)
         display_server_port (int): The port for the display server.
     """
     logger.info("Starting network components...")
-    peer_ip = discover_peer(timeout=10, port=gstreamer_port)
+    peer_ip = discover_peer(port=gstreamer_port)
     if peer_ip is None:
         logger.error("No peer found, exiting.")
         raise RuntimeError("No peer found")
 
-    server_thread = ServerClient(zmq_port, daemon=True)
+    server_thread = ServerClient(
+        zmq_port,
+        mode=ChannelMode(NETWORK_CONFIG["vars"]["zmq_mode"]),
+        wire_format=WireFormat(NETWORK_CONFIG["vars"]["zmq_wire_format"]),
+        daemon=True,
+    )
     server_thread.start()
 
     gstreamer_thread = GStreamerSender(
@@ -29,7 +42,13 @@ def start_network(zmq_port: int, gstreamer_port: int, display_server_port: int)
     )
     gstreamer_thread.start()
 
-    display_server_thread = DisplayServer(
+    # The async server serves all viewers from one event loop, see AsyncDisplayServer
+    display_server_cls = (
+        AsyncDisplayServer
+        if NETWORK_MODULE_CONFIG["display_server"].get("mode") == "async"
+        else DisplayServer
+    )
+    display_server_thread = display_server_cls(
         port=display_server_port,
         daemon=True,
     )
@@ -46,6 +65,13 @@ def start_network(zmq_port: int, gstreamer_port: int, display_server_port: int)
         display_server_thread,
         servo_manager_thread,
     )
+    if metrics_port := NETWORK_CONFIG["ports"].get("metrics"):
+        # Serve the link metrics on the local host, e.g. for `curl localhost:<port>/metrics`
+        metrics_server = MetricsServer(metrics_port, daemon=True)
+        metrics_server.register("zmq", server_thread.metrics.snapshot)
+        metrics_server.register("servos", servo_manager_thread.snapshot)
+        metrics_server.start()
+        threads += (metrics_server,)
     signal.signal(signal.SIGTERM, lambda _, __: stop_threads(threads))
     gstreamer_thread.join()
     stop_threads(threads)
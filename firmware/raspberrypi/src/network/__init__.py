@@ -1,5 +1,6 @@
+from .async_display_server import AsyncDisplayServer
 from .core import logger
 from .display_server import DisplayServer
 from .gstreamer import GStreamerSender
 
-__all__ = ["GStreamerSender", "logger", "DisplayServer"]
+__all__ = ["GStreamerSender", "logger", "DisplayServer", "AsyncDisplayServer"]
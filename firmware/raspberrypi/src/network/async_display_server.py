@@ -0,0 +1,376 @@
+import asyncio
+import json
+import time
+from typing import Any, Iterable, Optional
+
+from aiohttp import web
+
+from shared_src.common import StoppableThread
+from shared_src.network.metrics import LatencyHistogram
+
+from .core import logger
+from .direction_state import Direction
+from .display_server import (
+    KEEP_ALIVE_INTERVAL,
+    direction_of_transitions,
+    generate_frame,
+)
+
+
+class FrameHub:
+    """
+    Fans out the current display frame to all viewers.
+    Each frame is encoded once and published once, every viewer waits on the same
+    event and writes the latest frame at its own pace, so a slow viewer skips frames
+    instead of holding back the others.
+    """
+
+    def __init__(self) -> None:
+        self.direction = Direction.STRAIGHT
+        self.frame: Optional[bytes] = None
+        self.version = 0
+        self.viewers = 0
+        self.published = 0
+        self.commanded_at: Optional[float] = None
+        self._target: Optional[Direction] = None
+        self.command_to_display = LatencyHistogram("command to display")
+        self._changed = asyncio.Event()
+        self._closed = False
+
+    async def publish(
+        self, direction: Direction, commanded_at: Optional[float] = None
+    ) -> bool:
+        """
+        Encode the frame of a direction and wake up all viewers.
+        Must be called on the event loop of the hub.
+        Args:
+            direction (Direction): The new direction.
+            commanded_at (float, optional): Monotonic time of the command that set it.
+        Returns:
+            bool: True if the direction changed and its frame was published.
+        """
+        if direction == (self._target or self.direction) and self.frame is not None:
+            return False
+        self._target = direction
+        # Frames are cached after the first encoding, which runs off the loop
+        frame = await asyncio.get_running_loop().run_in_executor(
+            None, generate_frame, direction
+        )
+        if direction != self._target:
+            return False  # A newer direction was published in the meantime
+        self._target = None
+        if frame is None:
+            return False  # Not cached by `generate_frame`, the next publish retries
+        if direction == self.direction and self.frame is not None:
+            return False  # The pending direction was replaced by the one on screen
+        self.direction, self.frame, self.commanded_at = direction, frame, commanded_at
+        self.version += 1
+        self.published += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        return True
+
+    async def wait(self, version: int, timeout: Optional[float]) -> bool:
+        """
+        Wait until a frame newer than the given version is published.
+        Returns:
+            bool: True if there is a newer frame, False on timeout.
+        """
+        if self.version != version or self._closed:
+            return self.version != version
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.version != version
+
+    @property
+    def closed(self) -> bool:
+        """Check if the hub has been closed."""
+        return self._closed
+
+    def close(self) -> None:
+        """Wake up all viewers, so their streams end."""
+        self._closed = True
+        self._changed.set()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the state and the metrics of the hub."""
+        return {
+            "direction": self.direction.value,
+            "viewers": self.viewers,
+            "published": self.published,
+            "latency": {
+                self.command_to_display.name: self.command_to_display.snapshot()
+            },
+        }
+
+
+class EventHub:
+    """
+    Pushes small display events to Server-Sent Events subscribers.
+    Each subscriber has a bounded queue. A subscriber that falls behind is disconnected
+    instead of silently missing events, and browsers reconnect SSE streams by themselves,
+    starting again from the current state.
+    """
+
+    def __init__(self, queue_size: int = 64) -> None:
+        self.queue_size = queue_size
+        self.published = 0
+        self.lagging = 0
+        self._subscribers: set[asyncio.Queue[Optional[bytes]]] = set()
+
+    @property
+    def subscribers(self) -> int:
+        """Number of connected subscribers."""
+        return len(self._subscribers)
+
+    @staticmethod
+    def format(event: str, data: dict[str, Any]) -> bytes:
+        """Encode an event in the SSE wire format."""
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+    def subscribe(self) -> "asyncio.Queue[Optional[bytes]]":
+        """Register a subscriber, None in its queue ends its stream."""
+        queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Optional[bytes]]") -> None:
+        """Remove a subscriber."""
+        self._subscribers.discard(queue)
+
+    def publish(self, event: str, data: dict[str, Any]) -> None:
+        """
+        Send an event to all subscribers. Must be called on the event loop of the hub.
+        Args:
+            event (str): The name of the event.
+            data (dict[str, Any]): The JSON payload of the event.
+        """
+        message = self.format(event, data)
+        self.published += 1
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.lagging += 1
+                self._disconnect(queue)
+
+    def close(self) -> None:
+        """End the streams of all subscribers."""
+        for queue in list(self._subscribers):
+            self._disconnect(queue)
+
+    def _disconnect(self, queue: "asyncio.Queue[Optional[bytes]]") -> None:
+        """End the stream of a subscriber, even if its queue is full."""
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the metrics of the hub."""
+        return {
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "lagging": self.lagging,
+        }
+
+
+class AsyncDisplayServer(StoppableThread):
+    """
+    An asyncio counterpart of `DisplayServer`, which serves all viewers from one event loop
+    in this process instead of a gunicorn worker per viewer. The direction is published
+    to a `FrameHub` directly from `on_event`. Clients that render the display themselves
+    can subscribe to the direction and lane transition events on `/events` instead.
+    """
+
+    def __init__(self, port: int, *args, **kwargs):
+        """
+        Initialize the AsyncDisplayServer.
+        Args:
+            port (int): The port to bind to.
+        """
+        super().__init__(*args, **kwargs)
+        self._port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hub: Optional[FrameHub] = None
+        self._events: Optional[EventHub] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+        self._app = web.Application()
+        self._app.add_routes(
+            [
+                web.get("/", self._index),
+                web.get("/live_display", self._live_display),
+                web.get("/events", self._event_stream),
+                web.get("/set_direction/{direction}", self._set_direction),
+                web.get("/metrics", self._metrics),
+            ]
+        )
+
+    def run_with_exception_handling(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            logger.error(f"AsyncDisplayServer encountered an error: {e}")
+            raise  # Propagate error for reconnect logic
+        finally:
+            self._loop.close()
+
+    async def _serve(self) -> None:
+        """Serve the app until the server is disposed."""
+        self._hub = FrameHub()
+        self._events = EventHub()
+        self._stopped = asyncio.Event()
+        if not self.running:
+            return
+        await self._hub.publish(Direction.STRAIGHT)
+
+        runner = web.AppRunner(self._app, shutdown_timeout=1.0)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", self._port).start()
+        logger.info(f"AsyncDisplayServer started on port {self._port}")
+        try:
+            await self._stopped.wait()
+        finally:
+            self._hub.close()
+            self._events.close()
+            await runner.cleanup()
+
+    async def _index(self, request: web.Request) -> web.StreamResponse:
+        raise web.HTTPFound("/live_display")
+
+    async def _live_display(self, request: web.Request) -> web.StreamResponse:
+        """Stream the frames of the hub, see `generate_frames` for the timing."""
+        response = web.StreamResponse(
+            headers={"Content-Type": "multipart/x-mixed-replace; boundary=frame"}
+        )
+        await response.prepare(request)
+        hub = self._hub
+        hub.viewers += 1
+        try:
+            version = None
+            while not hub.closed:
+                # The first frame of a viewer is not a reaction to a command
+                changed = version is not None and version != hub.version
+                version, frame, commanded_at = hub.version, hub.frame, hub.commanded_at
+                if frame is not None:
+                    # Browsers show a part once the next one starts, so it is sent twice
+                    await response.write(frame + frame)
+                    if changed and commanded_at is not None:
+                        hub.command_to_display.record(time.monotonic() - commanded_at)
+                await hub.wait(version, KEEP_ALIVE_INTERVAL or None)
+        except ConnectionResetError:
+            pass  # The viewer disconnected
+        finally:
+            hub.viewers -= 1
+        return response
+
+    async def _event_stream(self, request: web.Request) -> web.StreamResponse:
+        """Stream the display events, starting with the current direction."""
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+            }
+        )
+        await response.prepare(request)
+        queue = self._events.subscribe()
+        try:
+            await response.write(
+                EventHub.format("direction", {"direction": self._hub.direction.value})
+            )
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        queue.get(), KEEP_ALIVE_INTERVAL or None
+                    )
+                except asyncio.TimeoutError:
+                    message = b": keep-alive\n\n"  # An SSE comment, ignored by clients
+                if message is None:
+                    break
+                await response.write(message)
+        except ConnectionResetError:
+            pass  # The subscriber disconnected
+        finally:
+            self._events.unsubscribe(queue)
+        return response
+
+    async def _publish_direction(
+        self, direction: Direction, commanded_at: Optional[float] = None
+    ) -> None:
+        """Publish a direction to the viewers and, if it changed, to the subscribers."""
+        if await self._hub.publish(direction, commanded_at):
+            self._events.publish(
+                "direction", {"direction": direction.value, "ts": time.time()}
+            )
+
+    async def _set_direction(self, request: web.Request) -> web.Response:
+        direction = request.match_info["direction"].lower()
+        if direction not in (d.value for d in Direction):
+            logger.error(f"Invalid direction: {direction}")
+            return web.Response(text="Invalid direction", status=400)
+        await self._publish_direction(Direction(direction))
+        return web.Response(text=f"Direction set to {direction}")
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {**self._hub.snapshot(), "events": self._events.snapshot()}
+        )
+
+    def on_event(self, command: str, value: Any):
+        """Handle incoming commands from the server."""
+        logger.debug(f"Received command: {command} with value: {value}")
+
+        match command:
+            case "exit":
+                logger.info("Exit command received, disposing server...")
+                self.dispose()
+            case "switch":
+                self.apply_transitions([value])
+            case "switch_batch":
+                frame_seq, transitions = value
+                logger.debug(
+                    f"Applying {len(transitions)} transitions of frame {frame_seq}"
+                )
+                self.apply_transitions(transitions, frame_seq)
+            case _:
+                return
+
+    def apply_transitions(
+        self, transitions: Iterable[tuple[int, int]], frame_seq: Optional[int] = None
+    ) -> None:
+        """
+        Update the display once for the lane transitions of a frame,
+        and push the transitions to the event subscribers.
+        Args:
+            transitions (Iterable[tuple[int, int]]): The (from_lane, to_lane) pairs.
+            frame_seq (int, optional): The sequence number of the frame on the Jetson.
+        """
+        transitions = [tuple(t) for t in transitions]
+        direction = direction_of_transitions(transitions)
+        if self._loop is None or self._hub is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(
+            self._events.publish,
+            "transitions",
+            {"frame_seq": frame_seq, "transitions": transitions, "ts": time.time()},
+        )
+        if direction is not None:
+            asyncio.run_coroutine_threadsafe(
+                self._publish_direction(direction, time.monotonic()), self._loop
+            )
+
+    def dispose(self):
+        """
+        Dispose of the AsyncDisplayServer.
+        """
+        self.stop()
+        if self._loop is not None and self._stopped is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass  # The loop is closed already
+        logger.info("AsyncDisplayServer disposed")
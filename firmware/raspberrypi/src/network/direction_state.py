@@ -0,0 +1,171 @@
+import os
+import select
+import shutil
+import socket
+import struct
+import tempfile
+import time
+from enum import Enum
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Optional
+
+from .core import logger
+
+
+class Direction(Enum):
+    STRAIGHT = "straight"
+    LEFT = "left"
+    RIGHT = "right"
+
+
+_DIRECTIONS: list[Direction] = list(Direction)
+
+
+class SharedDirectionState:
+    """
+    The direction of the display, shared between the firmware process and the
+    display server workers through a named shared memory block.
+    The firmware process is the only writer. Readers detect changes by the version,
+    which is odd while a write is in progress (a seqlock), so they never see a torn state.
+    Each reader binds a Unix datagram socket, which the writer signals after every write,
+    so readers block in `wait` instead of polling the block.
+    """
+
+    # Version, direction index and the monotonic time of the command that set it
+    _LAYOUT = struct.Struct("<QBd")
+
+    def __init__(self, name: str, create: bool = False) -> None:
+        """
+        Create or attach to the shared direction state.
+        Args:
+            name (str): The name of the shared memory block.
+            create (bool): Create the block (writer) instead of attaching to it (reader).
+        """
+        self.name = name
+        self._owner = create
+        self._socket_dir = Path(tempfile.gettempdir(), f"{name}.sockets")
+        self._socket_dir.mkdir(exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket_path: Optional[Path] = None
+        # Reader sockets, rescanned when the directory changes
+        self._readers: list[Path] = []
+        self._readers_mtime = 0
+        if create:
+            try:
+                self._shm = shared_memory.SharedMemory(
+                    name, create=True, size=self._LAYOUT.size
+                )
+                self._LAYOUT.pack_into(self._shm.buf, 0, 0, 0, 0.0)
+            except FileExistsError:
+                # Left behind by a previous run, it is reused as is
+                self._shm = shared_memory.SharedMemory(name)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            # Readers must not unlink the block when they exit
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+            self._socket_path = Path(self._socket_dir, f"{os.getpid()}-{id(self)}.sock")
+            self._socket_path.unlink(missing_ok=True)
+            self._socket.bind(self._socket_path.as_posix())
+        self._version = self._LAYOUT.unpack_from(self._shm.buf, 0)[0] & ~1
+
+    def set(self, direction: Direction) -> None:
+        """
+        Publish a new direction. Must only be called by the writer.
+        Args:
+            direction (Direction): The new direction.
+        """
+        self._version += 1
+        self._LAYOUT.pack_into(self._shm.buf, 0, self._version, 0, 0.0)
+        self._version += 1
+        self._LAYOUT.pack_into(
+            self._shm.buf,
+            0,
+            self._version,
+            _DIRECTIONS.index(direction),
+            time.monotonic(),
+        )
+        self._notify_readers()
+
+    def _notify_readers(self) -> None:
+        """Wake up all readers blocked in `wait`."""
+        mtime = self._socket_dir.stat().st_mtime_ns
+        if mtime != self._readers_mtime:
+            self._readers_mtime = mtime
+            self._readers = list(self._socket_dir.glob("*.sock"))
+        for path in self._readers:
+            self._signal(path)
+
+    def _signal(self, path: Path) -> None:
+        """Send a wake-up datagram to a reader socket."""
+        try:
+            self._socket.sendto(b"\0", path.as_posix())
+        except BlockingIOError:
+            pass  # The reader has pending wake-ups already
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a reader that did not exit cleanly
+            path.unlink(missing_ok=True)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Block until the writer signals a change, `wake` is called or the timeout expires.
+        Call `get` afterwards, a signal does not carry the state itself.
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds, None waits forever.
+        """
+        if select.select([self._socket], [], [], timeout)[0]:
+            while True:
+                try:
+                    self._socket.recv(64)
+                except (BlockingIOError, OSError):
+                    return
+
+    def wake(self) -> None:
+        """Wake up this reader, e.g. to let a watcher thread exit."""
+        if self._socket_path is not None:
+            self._signal(self._socket_path)
+
+    def get(self) -> tuple[int, Direction, float]:
+        """
+        Read a consistent snapshot of the state.
+        Returns:
+            tuple[int, Direction, float]: The version, the direction and the monotonic
+                time of the command that set it.
+        """
+        while True:
+            version, index, commanded_at = self._LAYOUT.unpack_from(self._shm.buf, 0)
+            if (
+                version % 2 == 0
+                and self._LAYOUT.unpack_from(self._shm.buf, 0)[0] == version
+            ):
+                return version, _DIRECTIONS[index], commanded_at
+
+    def close(self) -> None:
+        """Detach from the block, the writer also removes it."""
+        self._shm.close()
+        self._socket.close()
+        if self._socket_path is not None:
+            self._socket_path.unlink(missing_ok=True)
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+        logger.debug(f"Shared direction state {self.name} closed")
+
+
+def attach_direction_state(name: str) -> Optional[SharedDirectionState]:
+    """
+    Attach to the shared direction state as a reader.
+    Args:
+        name (str): The name of the shared memory block.
+    Returns:
+        Optional[SharedDirectionState]: The state, or None if no writer created it.
+    """
+    try:
+        return SharedDirectionState(name)
+    except FileNotFoundError:
+        logger.warning(f"Shared direction state {name} not found, using local state")
+        return None
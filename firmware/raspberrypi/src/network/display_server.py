@@ -1,38 +1,57 @@
+import atexit
 import subprocess as sp
+import threading
 import time
-from enum import Enum
-from typing import Any, Optional
+from typing import Any, Iterable, Optional
 
 import cv2
-import requests as req
-from flask import Flask, Response, redirect, url_for
+from flask import Flask, Response, jsonify, redirect, url_for
 
 from shared_src.common import StoppableThread
 from shared_src.network import NETWORK_CONFIG
+from shared_src.network.metrics import LatencyHistogram
 
 from .core import MODULE_CONFIG, logger
+from .direction_state import Direction, SharedDirectionState, attach_direction_state
 
 _app = Flask(__name__)
 
 
-class Direction(Enum):
-    STRAIGHT = "straight"
-    LEFT = "left"
-    RIGHT = "right"
-
-
-FPS: int = MODULE_CONFIG["display_server"].get("fps")
+KEEP_ALIVE_INTERVAL: float = MODULE_CONFIG["display_server"].get(
+    "keep_alive_interval", 5.0
+)
+RESOLUTION: Optional[list[int]] = MODULE_CONFIG["display_server"].get("resolution")
+JPEG_QUALITY: int = MODULE_CONFIG["display_server"].get("jpeg_quality", 90)
+SHARED_STATE_NAME: str = MODULE_CONFIG["display_server"].get(
+    "shared_state_name", "lanepilot_direction"
+)
+STATE_RESYNC_INTERVAL: float = MODULE_CONFIG["display_server"].get(
+    "state_resync_interval", 1.0
+)
 _current_direction: Direction = Direction.STRAIGHT
+# Monotonic time of the command that set the current direction, if known
+_commanded_at: Optional[float] = None
+# Notifies the streams of this worker about direction changes
+_direction_changed = threading.Condition()
+# The state written by the DisplayServer in the firmware process, watched by each worker
+_shared_state: Optional[SharedDirectionState] = None
+_watcher_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+_watcher_stopped = threading.Event()
+# Time from the command to the first frame of the new direction on a stream
+_command_to_display = LatencyHistogram("command to display")
 _file_name_map = MODULE_CONFIG["display_server"].get("file_name_map")
+# Ready-made multipart chunks per direction, the images never change at runtime
+_frame_cache: dict[Direction, bytes] = {}
 
 
-def generate_frame(direction: Direction) -> Optional[bytes]:
+def encode_frame(direction: Direction) -> Optional[bytes]:
     """
-    Generate a frame from the given file name.
+    Read, resize and encode the image of the given direction as a multipart chunk.
     Args:
-        direction (Direction): The direction to generate the frame for.
+        direction (Direction): The direction to encode the frame for.
     Returns:
-        bytes: The generated frame as bytes.
+        bytes: The multipart chunk of the frame, or None if the image could not be read.
     """
     file_name = _file_name_map.get(direction.value)
     try:
@@ -41,7 +60,11 @@ def generate_frame(direction: Direction) -> Optional[bytes]:
             logger.error(f"Failed to read image from {file_name}")
             return None
 
-        ret, buffer = cv2.imencode(".jpg", frame)
+        if RESOLUTION:
+            frame = cv2.resize(frame, tuple(RESOLUTION), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+        )
         if not ret:
             logger.error(f"Failed to encode image from {file_name}")
             return None
@@ -56,18 +79,110 @@ def generate_frame(direction: Direction) -> Optional[bytes]:
         return None
 
 
+def generate_frame(direction: Direction) -> Optional[bytes]:
+    """
+    Get the frame of the given direction, encoding it on first use.
+    Args:
+        direction (Direction): The direction to generate the frame for.
+    Returns:
+        bytes: The generated frame as bytes.
+    """
+    if (frame := _frame_cache.get(direction)) is None:
+        # Failures are not cached, so a missing image is picked up once it exists
+        if (frame := encode_frame(direction)) is not None:
+            _frame_cache[direction] = frame
+            logger.info(f"Encoded the {direction.value} frame ({len(frame)} bytes)")
+    return frame
+
+
+def _set_current_direction(
+    direction: Direction, commanded_at: Optional[float] = None
+) -> None:
+    """
+    Set the current direction and wake up the streams if it changed.
+    Args:
+        direction (Direction): The new direction.
+        commanded_at (float, optional): Monotonic time of the command that set it.
+    """
+    global _current_direction, _commanded_at
+    with _direction_changed:
+        if direction == _current_direction:
+            return
+        _current_direction = direction
+        _commanded_at = commanded_at
+        _direction_changed.notify_all()
+
+
+def _watch_shared_state(state: SharedDirectionState) -> None:
+    """Apply the changes of the shared state to this worker, whenever the writer signals one.
+    The state is also re-read every `STATE_RESYNC_INTERVAL` seconds, in case a signal is lost.
+    """
+    version = None
+    while not _watcher_stopped.is_set():
+        current_version, direction, commanded_at = state.get()
+        if current_version != version:
+            version = current_version
+            _set_current_direction(direction, commanded_at or None)
+        state.wait(STATE_RESYNC_INTERVAL or None)
+
+
+def _stop_watcher() -> None:
+    """Stop the watcher and detach from the shared state when the worker exits."""
+    global _shared_state
+    _watcher_stopped.set()
+    if _shared_state is None or _watcher is None:
+        return
+    _shared_state.wake()
+    _watcher.join(timeout=1.0)
+    _shared_state.close()
+    _shared_state = None
+
+
+def _ensure_watcher() -> None:
+    """Attach to the shared state and start watching it, once per worker."""
+    global _shared_state, _watcher
+    with _watcher_lock:
+        if _watcher is not None:
+            return
+        _shared_state = attach_direction_state(SHARED_STATE_NAME)
+        if _shared_state is None:
+            return  # Only the /set_direction route sets the direction
+        _watcher = threading.Thread(
+            target=_watch_shared_state,
+            args=(_shared_state,),
+            name="DirectionWatcher",
+            daemon=True,
+        )
+        _watcher.start()
+        atexit.register(_stop_watcher)
+
+
 def generate_frames():
     """
     Generate frames for the live display.
+    A frame is only sent when the direction changes, and repeated every
+    `KEEP_ALIVE_INTERVAL` seconds so clients and proxies keep the stream open.
     Yields:
         bytes: The generated frame as bytes.
     """
+    _ensure_watcher()
+    direction, commanded_at = _current_direction, None
     while True:
-        # Generate the frame based on the direction
-        frame = generate_frame(_current_direction)
+        frame = generate_frame(direction)
         if frame is not None:
+            # Browsers show a part once the next one starts, so it is sent twice
             yield frame
-        time.sleep(1 / FPS)  # Control the frame rate
+            yield frame
+            if commanded_at is not None:
+                _command_to_display.record(time.monotonic() - commanded_at)
+
+        with _direction_changed:
+            changed = _direction_changed.wait_for(
+                lambda: _current_direction != direction,
+                timeout=KEEP_ALIVE_INTERVAL or None,
+            )
+            direction = _current_direction
+            commanded_at = _commanded_at if changed else None
 
 
 @_app.route("/")
@@ -84,15 +199,27 @@ def set_direction(direction: str):
     Returns:
         str: A message indicating the result of the operation.
     """
-    global _current_direction
-    if direction in Direction.__members__:
-        _current_direction = Direction[direction]
+    if direction.lower() in (d.value for d in Direction):
+        _set_current_direction(Direction(direction.lower()))
         return f"Direction set to {direction}", 200
     else:
         logger.error(f"Invalid direction: {direction}")
         return "Invalid direction", 400
 
 
+@_app.route("/metrics")
+def metrics():
+    """
+    Get the display metrics of the worker that serves the request.
+    """
+    return jsonify(
+        {
+            "direction": _current_direction.value,
+            "latency": {_command_to_display.name: _command_to_display.snapshot()},
+        }
+    )
+
+
 @_app.route("/live_display")
 def live_display():
     return Response(
@@ -101,6 +228,39 @@ def live_display():
     )
 
 
+def direction_of_transitions(
+    transitions: Iterable[tuple[int, int]],
+) -> Optional[Direction]:
+    """
+    Get the direction to display for the lane transitions of a frame.
+    The last valid transition determines the direction, as if they were applied in order.
+    Args:
+        transitions (Iterable[tuple[int, int]]): The (from_lane, to_lane) pairs.
+    Returns:
+        Optional[Direction]: The direction, or None if no transition is valid.
+    """
+    #! We suppose that the lanes are numbered from 0 to n-1 from left to right
+    #! This makes it easier to manage the directions
+    direction: Optional[Direction] = None
+
+    for from_lane, to_lane in transitions:
+        if from_lane < 0 or to_lane < 0:
+            logger.error(
+                f"Invalid lane mapping: Lanes {from_lane} or {to_lane} not found"
+            )
+            continue
+
+        if from_lane == to_lane:
+            direction = Direction.STRAIGHT
+        elif from_lane < to_lane:
+            direction = Direction.RIGHT
+        else:
+            direction = Direction.LEFT
+        logger.info(f"Switching from lane {from_lane} to lane {to_lane}")
+
+    return direction
+
+
 class DisplayServer(StoppableThread):
     def __init__(self, port: int, *args, **kwargs):
         """
@@ -113,6 +273,8 @@ class DisplayServer(StoppableThread):
         self._module = __name__.split(".")[-1]
         self._process: Optional[sp.Popen] = None
         self._port = port
+        # Created before the workers start, so they can attach to it
+        self._state = SharedDirectionState(SHARED_STATE_NAME, create=True)
 
     def run_with_exception_handling(self) -> None:
         try:
@@ -138,30 +300,28 @@ class DisplayServer(StoppableThread):
                 logger.info("Exit command received, disposing server...")
                 self.dispose()
             case "switch":
-                #! We suppose that the lanes are numbered from 0 to n-1 from left to right
-                #! This makes it easier to manage the directions
-
-                from_lane, to_lane = value
-                if from_lane < 0 or to_lane < 0:
-                    logger.error(
-                        f"Invalid lane mapping: Lanes {from_lane} or {to_lane} not found"
-                    )
-                    return
-
-                if from_lane == to_lane:
-                    direction = Direction.STRAIGHT
-                elif from_lane < to_lane:
-                    direction = Direction.RIGHT
-                else:
-                    direction = Direction.LEFT
-
-                req.get(
-                    f"http://localhost:{self._port}/set_direction/{direction.value}"
+                self.apply_transitions([value])
+            case "switch_batch":
+                frame_seq, transitions = value
+                logger.debug(
+                    f"Applying {len(transitions)} transitions of frame {frame_seq}"
                 )
-                logger.info(f"Switching from lane {from_lane} to lane {to_lane}")
+                self.apply_transitions(transitions)
             case _:
                 return
 
+    def apply_transitions(self, transitions: Iterable[tuple[int, int]]) -> None:
+        """
+        Update the display once for the lane transitions of a frame.
+        Args:
+            transitions (Iterable[tuple[int, int]]): The (from_lane, to_lane) pairs.
+        """
+        direction = direction_of_transitions(transitions)
+        if direction is None:
+            return
+        # The workers watch the shared state, there is no request to wait for
+        self._state.set(direction)
+
     def dispose(self):
         """
         Dispose of the DisplayServer.
@@ -174,3 +334,4 @@ class DisplayServer(StoppableThread):
         else:
             logger.warning("DisplayServer process not found")
         self._process = None
+        self._state.close()
@@ -1,11 +1,25 @@
+from .async_server_client import AsyncServerClient
 from .broadcasting import discover_peer, respond_to_broadcast
+from .channel import ChannelMode
+from .codec import WireFormat, decode_message, encode_message
 from .core import NETWORK_CONFIG, logger
+from .dispatch import ListenerDispatcher
+from .metrics import ChannelMetrics, LatencyHistogram, MetricsServer
 from .server_client import ServerClient
 
 __all__ = [
     "discover_peer",
     "respond_to_broadcast",
+    "ChannelMode",
     "ServerClient",
+    "AsyncServerClient",
+    "WireFormat",
+    "encode_message",
+    "decode_message",
+    "ChannelMetrics",
+    "LatencyHistogram",
+    "MetricsServer",
+    "ListenerDispatcher",
     "NETWORK_CONFIG",
     "logger",
 ]
@@ -0,0 +1,234 @@
+import asyncio
+import inspect
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import zmq
+import zmq.asyncio
+
+from .channel import ChannelMode, CommandChannel
+from .codec import WireFormat
+from .core import logger
+
+
+class AsyncServerClient(CommandChannel):
+    """
+    An asyncio counterpart of `ServerClient` on `zmq.asyncio`.
+    It runs as a task on an event loop instead of a thread, so one loop can serve
+    several sockets concurrently. Listeners can be coroutine functions, which are awaited
+    on the loop, or plain functions, which are bridged to a single worker thread so they
+    keep their order and never block the loop.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        *,
+        is_server: bool = True,
+        server_ip: Optional[str] = None,
+        mode: ChannelMode = ChannelMode.DEALER_ROUTER,
+        high_water_mark: int = 100,
+        conflate: bool = False,
+        acks: bool = False,
+        wire_format: WireFormat = WireFormat.BINARY,
+        heartbeat_interval: float = 1.0,
+        metrics_log_interval: float = 60.0,
+    ) -> None:
+        """Initialize the server/client.
+
+        Args:
+            port (int): The port to bind to.
+            is_server (bool): Whether to bind (server) or connect (client).
+            server_ip (str, optional): The IP of the server, required in client mode.
+            mode (ChannelMode): The messaging pattern of the channel. The lockstep
+                request/reply pattern is not supported.
+            high_water_mark (int): Maximum number of queued messages per direction.
+            conflate (bool): Keep only the latest message (push/pull mode only).
+            acks (bool): Request an acknowledgement for each command (dealer/router mode only).
+            wire_format (WireFormat): The preferred encoding, see `ServerClient`.
+            heartbeat_interval (float): Seconds between heartbeats, 0 disables them.
+            metrics_log_interval (float): Seconds between metrics summaries in the log.
+        """
+        if mode == ChannelMode.REQUEST_REPLY:
+            raise ValueError("The asyncio channel does not support request/reply mode.")
+
+        self._disposed = False
+        self._task: Optional[asyncio.Task] = None
+        self._sync_executor: Optional[ThreadPoolExecutor] = None
+        self._init_channel(
+            zmq.asyncio.Context(),
+            port,
+            is_server,
+            server_ip,
+            mode,
+            high_water_mark,
+            conflate,
+            acks,
+            wire_format,
+            heartbeat_interval,
+            metrics_log_interval,
+        )
+        logger.info(
+            f"{self.type} (asyncio) started on port {self.port} ({self.mode.value})"
+        )
+
+    @property
+    def running(self) -> bool:
+        """Check if the receive loop is running."""
+        return self._task is not None and not self._task.done()
+
+    async def __aenter__(self) -> "AsyncServerClient":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.dispose()
+
+    def start(self) -> asyncio.Task:
+        """Start the receive loop as a task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def run(self) -> None:
+        """Receive and dispatch messages until the channel is stopped or an exit command arrives."""
+        if hello := self._hello_message():
+            self._send_message(hello)
+        ticker = asyncio.get_running_loop().create_task(self._tick_periodically())
+        try:
+            while True:
+                if not self.can_receive:
+                    # Send-only ends have nothing to receive, wait for the stop signal
+                    await asyncio.Event().wait()
+                try:
+                    frames = await self._socket.recv_multipart()
+                except zmq.ZMQError as e:
+                    logger.error(f"{self.type} error: {e}")
+                    raise ConnectionError(f"{self.type} connection lost: {e}")
+                received = time.perf_counter()
+
+                try:
+                    data, identity = self._decode(frames)
+                except (ValueError, struct.error) as e:
+                    self._drop_undecodable(frames, e)
+                    continue
+                keep_running = await self._handle(data, identity)
+                self.metrics.dispatch_latency.record(time.perf_counter() - received)
+                if not keep_running:
+                    break
+
+        except asyncio.CancelledError:
+            pass  # Stopped by `stop` or `dispose`
+
+        except Exception as e:
+            logger.error(f"{self.type} encountered an error: {e}")
+            raise  # Propagate the error for reconnect logic
+
+        finally:
+            ticker.cancel()
+            self._close()
+
+    async def _tick_periodically(self) -> None:
+        """Send heartbeats and log the metrics while the receive loop is running."""
+        interval = min(
+            i for i in (self.heartbeat_interval, self.metrics_log_interval, 1.0) if i
+        )
+        while True:
+            self._tick()
+            await asyncio.sleep(interval)
+
+    async def _handle(self, data: dict, identity: Optional[bytes]) -> bool:
+        """Handle a received message.
+
+        Returns:
+            bool: False if the channel should shut down, True otherwise.
+        """
+        if self._handle_control(data, identity):
+            return True
+
+        command, value = data.get("command"), data.get("value")
+        if command == "exit":
+            logger.info(f"Exit command received, shutting down {self.type}.")
+            self._reply(identity, {"command": "status", "value": "ok"})
+            return False
+
+        for listener in self.listeners:
+            res = await self._call_listener(listener, command, value)
+            if res:
+                command, value = res
+                self._reply(identity, {"command": command, "value": value})
+
+        self._acknowledge(data, identity)
+        return True
+
+    async def _call_listener(self, listener: Callable, command: str, value: Any) -> Any:
+        """Await a coroutine listener, or run a sync listener on the bridge thread."""
+        if inspect.iscoroutinefunction(listener):
+            return await listener(command, value)
+        if self._sync_executor is None:
+            self._sync_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="AsyncServerClientListener"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._sync_executor, listener, command, value)
+
+    def _send_frames(self, frames: list[bytes]) -> bool:
+        # Non-blocking sends on asyncio sockets complete immediately
+        future = self._socket.send_multipart(frames, flags=zmq.NOBLOCK)
+        exception = future.exception()
+        if isinstance(exception, zmq.Again):
+            return False
+        if exception is not None:
+            logger.error(f"{self.type} failed to send message: {exception}")
+            raise ConnectionError(f"{self.type} send failed: {exception}")
+        return True
+
+    def _send_message(self, data: dict) -> bool:
+        """Encode and send a message without blocking."""
+        start = time.perf_counter()
+        if not self._transmit([self._encode(data)]):
+            logger.warning(
+                f"{self.type} dropped command '{data['command']}', peer is not reading."
+            )
+            return False
+        self.metrics.send_latency.record(time.perf_counter() - start)
+        return True
+
+    def send(self, command: str, value: Optional[Any] = None) -> bool:
+        """Send a command to the server. This never blocks and must be called on the event loop.
+        Args:
+            command (str): The command to send.
+            value (Any, optional): The value associated with the command.
+        Returns:
+            bool: True if the command was sent, False if it was dropped.
+        """
+        return self._send_message(self._new_message(command, value))
+
+    def stop(self) -> None:
+        """Stop the receive loop."""
+        if self.running:
+            self._task.cancel()
+
+    async def dispose(self) -> None:
+        """Stop the receive loop and clean up the resources."""
+        self.stop()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._close()
+
+    def _close(self) -> None:
+        """Close the socket, the context and the listener bridge."""
+        if self._disposed:
+            return
+        self._disposed = True
+        self.listeners.clear()
+        if self._sync_executor is not None:
+            self._sync_executor.shutdown(wait=False, cancel_futures=True)
+        self._socket.close()
+        self._context.term()
+        logger.info(self.metrics.summary())
+        logger.info(f"{self.type} {self.metrics.send_latency.summary()}")
+        logger.info(f"{self.type} {self.metrics.dispatch_latency.summary()}")
+        logger.info(f"{self.type} (asyncio) disposed.")
@@ -1,74 +1,142 @@
 import hashlib
 import hmac
+import json
 import os
+import select
 import socket
+import time
+from pathlib import Path
 from typing import Optional
 
+from ..common import Config
 from .core import NETWORK_CONFIG, logger
 
+# The last discovered peer, probed first on the next discovery
+PEER_CACHE_PATH: Path = Path(
+    Config.get("global_cache_dir"), "network", "last_peer.json"
+)
+
+
+def _handshake_hmac(challenge: bytes) -> bytes:
+    """Compute the response to a discovery challenge with the shared secret."""
+    return hmac.new(
+        NETWORK_CONFIG["vars"].get("handshake").encode(),
+        challenge,
+        hashlib.sha256,
+    ).digest()
+
+
+def load_cached_peer(cache_path: Path = PEER_CACHE_PATH) -> Optional[str]:
+    """
+    Get the IP address of the last discovered peer, if one was cached.
+    """
+    try:
+        return json.loads(cache_path.read_text()).get("ip")
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_peer(ip: str, cache_path: Path) -> None:
+    """Persist the IP address of the discovered peer for the next discovery."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps({"ip": ip, "time": time.time()}))
+    except OSError as e:
+        logger.warning(f"Failed to cache peer address: {e}")
+
 
 def discover_peer(
     port: int = NETWORK_CONFIG["ports"].get("gstreamer"),
-    timeout: int = 10,
-    retries: int = 3,
+    timeout: float = 30,
+    initial_delay: float = 0.1,
+    max_delay: float = 2.0,
+    broadcast_ip: Optional[str] = NETWORK_CONFIG["ips"].get("broadcast"),
+    cache_path: Path = PEER_CACHE_PATH,
 ) -> Optional[str]:
     """
-    Sends a broadcast message to discover peers on the network.
-    Listens for a response and returns the IP address of the discovered peer.
+    Discover the peer on the network and return its IP address.
+    The last known peer is probed by unicast first, as it usually answers right away.
+    Afterwards broadcast and unicast probes are sent together, with an exponentially
+    growing delay between the rounds, until a peer passes the HMAC handshake.
+
+    Args:
+        port (int): The port the peer listens on for discovery requests.
+        timeout (float): Maximum time to search for the peer in seconds.
+        initial_delay (float): Time to wait for a response after the first round in seconds.
+        max_delay (float): Upper bound of the delay between two rounds in seconds.
+        broadcast_ip (str, optional): The broadcast address to probe.
+        cache_path (Path): The file the last known peer is persisted in.
+
+    Returns:
+        Optional[str]: The IP address of the peer, or None if no peer was found in time.
     """
-    broadcast_ip = NETWORK_CONFIG["ips"].get("broadcast")
     self_ip = NETWORK_CONFIG["ips"].get("self")
-    if not broadcast_ip or not self_ip:
-        logger.error("Broadcast or self IP not configured in NETWORK_CONFIG.")
+    cached_ip = load_cached_peer(cache_path)
+    if not broadcast_ip and not cached_ip:
+        logger.error(
+            "Broadcast IP not configured in NETWORK_CONFIG and no cached peer."
+        )
         return None
 
-    for attempt in range(retries):
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.settimeout(timeout)
-            sock.bind(("", 0))
-
-            challenge = os.urandom(16)
-            message = b"P2P_BROADCAST_REQ:" + challenge
-            try:
-                sock.sendto(message, (broadcast_ip, port))
-                logger.info(
-                    f"[{attempt+1}/{retries}] Broadcasting to {broadcast_ip}:{port}, waiting for response..."
-                )
-
-                data, addr = sock.recvfrom(1024)
+    started = time.perf_counter()
+    deadline = started + timeout
+    delay = initial_delay
+    # Responses only carry the HMAC, so every challenge of this discovery is accepted
+    expected: set[bytes] = set()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(("", 0))
+
+        attempt = 0
+        while (now := time.perf_counter()) < deadline:
+            attempt += 1
+            targets = [ip for ip in dict.fromkeys((cached_ip, broadcast_ip)) if ip]
+            if attempt == 1 and cached_ip:
+                targets = [cached_ip]  # Give the cached peer a head start
+            for target in targets:
+                challenge = os.urandom(16)
+                expected.add(_handshake_hmac(challenge))
+                try:
+                    sock.sendto(b"P2P_BROADCAST_REQ:" + challenge, (target, port))
+                except OSError as e:
+                    logger.debug(f"Failed to probe {target}:{port}: {e}")
+            logger.info(
+                f"[{attempt}] Probing {', '.join(targets)} on port {port}, waiting for response..."
+            )
+
+            # Wait for a valid response until the next round is due
+            round_end = min(now + delay, deadline)
+            delay = min(delay * 2, max_delay)
+            while (remaining := round_end - time.perf_counter()) > 0:
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    break
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except OSError as e:
+                    logger.debug(f"Error while receiving discovery response: {e}")
+                    continue
                 if addr[0] == self_ip:
                     logger.info(f"Received response from self ({addr[0]}), ignoring.")
-                    return None
-
-                logger.info(f"Found peer at {addr[0]}: {data}")
-
+                    continue
                 if not data.startswith(b"P2P_BROADCAST_RES:"):
-                    logger.warning("Invalid response, expected P2P_BROADCAST_RES.")
-                    return None
-
+                    logger.warning(f"Invalid response from {addr[0]}: {data}")
+                    continue
                 received_hmac = data.split(b":", 1)[1]
-                expected_hmac = hmac.new(
-                    NETWORK_CONFIG["vars"].get("handshake").encode(),
-                    challenge,
-                    hashlib.sha256,
-                ).digest()
-                if not hmac.compare_digest(received_hmac, expected_hmac):
-                    logger.warning("HMAC verification failed. Peer not authorized.")
-                    return None
-
-                return addr[0]
+                if not any(hmac.compare_digest(received_hmac, h) for h in expected):
+                    logger.warning(
+                        f"HMAC verification failed for {addr[0]}. Peer not authorized."
+                    )
+                    continue
 
-            except socket.timeout:
-                logger.warning(
-                    f"Attempt {attempt+1} timed out. Retrying..."
-                    if attempt < retries - 1
-                    else "No response, peer not found."
+                source = "cached" if addr[0] == cached_ip else "discovered"
+                logger.info(
+                    f"Found {source} peer at {addr[0]} in {time.perf_counter() - started:.3f}s"
                 )
-            except Exception as e:
-                logger.error(f"Error during peer discovery: {e}")
-                return None
+                _cache_peer(addr[0], cache_path)
+                return addr[0]
 
+    logger.warning(f"No response, peer not found within {timeout}s.")
     return None
 
 
@@ -79,8 +147,10 @@ def respond_to_broadcast(
 ) -> Optional[str]:
     """
     Listens for broadcast messages and responds to discovery requests.
+    Unicast probes of a peer that cached this device are answered the same way.
     """
     self_ip = NETWORK_CONFIG["ips"].get("self")
+    started = time.perf_counter()
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         if timeout:
@@ -100,15 +170,12 @@ def respond_to_broadcast(
 
                 if data.startswith(b"P2P_BROADCAST_REQ:"):
                     challenge = data.split(b":", 1)[1]
-                    response_hmac = hmac.new(
-                        NETWORK_CONFIG["vars"].get("handshake").encode(),
-                        challenge,
-                        hashlib.sha256,
-                    ).digest()
-                    response = b"P2P_BROADCAST_RES:" + response_hmac
+                    response = b"P2P_BROADCAST_RES:" + _handshake_hmac(challenge)
                     sock.sendto(response, addr)
                     if stop_on_response:
-                        logger.info("Response sent, stopping broadcast responder.")
+                        logger.info(
+                            f"Response sent after {time.perf_counter() - started:.3f}s, stopping broadcast responder."
+                        )
                         return addr[0]
                 else:
                     logger.warning(f"Invalid message received from {addr[0]}: {data}")
@@ -0,0 +1,338 @@
+import time
+from enum import Enum
+from typing import Any, Callable, Optional
+
+import zmq
+
+from ..common import get_parent_class
+from .codec import (
+    PROTOCOL_VERSION,
+    SUPPORTED_VERSIONS,
+    WireFormat,
+    decode_message,
+    encode_message,
+    negotiate_version,
+)
+from .core import logger
+from .metrics import ChannelMetrics
+
+
+class ChannelMode(Enum):
+    """Enum to represent the messaging patterns of the command channel."""
+
+    REQUEST_REPLY = "request_reply"  # Synchronous round trip per command
+    PUSH_PULL = "push_pull"  # Fire-and-forget from the client to the server
+    DEALER_ROUTER = "dealer_router"  # Asynchronous, with optional acknowledgements
+
+
+# (server socket type, client socket type) per channel mode
+_SOCKET_TYPES: dict[ChannelMode, tuple[int, int]] = {
+    ChannelMode.REQUEST_REPLY: (zmq.REP, zmq.REQ),
+    ChannelMode.PUSH_PULL: (zmq.PULL, zmq.PUSH),
+    ChannelMode.DEALER_ROUTER: (zmq.ROUTER, zmq.DEALER),
+}
+
+
+class CommandChannel:
+    """
+    The protocol of the command channel, shared by the threaded and the asyncio
+    implementation: socket setup, listeners, acknowledgements, the wire format
+    negotiation, heartbeats and metrics. Subclasses own the socket I/O loop and
+    implement `_send_frames`.
+    """
+
+    def _init_channel(
+        self,
+        context: zmq.Context,
+        port: int,
+        is_server: bool,
+        server_ip: Optional[str],
+        mode: ChannelMode,
+        high_water_mark: int,
+        conflate: bool,
+        acks: bool,
+        wire_format: WireFormat,
+        heartbeat_interval: float,
+        metrics_log_interval: float,
+    ) -> None:
+        """Initialize the channel state and create the channel socket."""
+        if conflate and mode != ChannelMode.PUSH_PULL:
+            raise ValueError("Conflation is only supported in push/pull mode.")
+        if acks and mode != ChannelMode.DEALER_ROUTER:
+            raise ValueError(
+                "Acknowledgements are only supported in dealer/router mode."
+            )
+
+        self.listeners: list[Callable] = []
+        self.port = port
+        self.mode = mode
+        self.is_server = is_server
+        self.acks = acks
+        self.heartbeat_interval = heartbeat_interval
+        self.metrics_log_interval = metrics_log_interval
+        self._next_heartbeat = 0.0
+        self._next_metrics_log = time.monotonic() + metrics_log_interval
+        self._peer_identity: Optional[bytes] = None
+        self._last_received_at = 0.0
+        self._seq = 0
+        self._unacked: set[int] = set()
+        self._awaiting_reply = False
+        self.wire_format = wire_format
+        self._active_format = (
+            wire_format if mode == ChannelMode.PUSH_PULL else WireFormat.JSON
+        )
+        self._active_version = PROTOCOL_VERSION
+
+        server_type, client_type = _SOCKET_TYPES[mode]
+        self._context = context
+        self._socket = self._context.socket(server_type if is_server else client_type)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        if conflate:
+            self._socket.setsockopt(zmq.CONFLATE, 1)
+        else:
+            self._socket.setsockopt(zmq.SNDHWM, high_water_mark)
+            self._socket.setsockopt(zmq.RCVHWM, high_water_mark)
+
+        if is_server:
+            self.type = "ZeroMQ server"
+            self._socket.bind(f"tcp://*:{self.port}")
+        else:
+            self.type = "ZeroMQ client"
+            self.server_ip = server_ip
+            if not self.server_ip:
+                raise ValueError("Server IP is required for client mode.")
+            self._socket.connect(f"tcp://{self.server_ip}:{self.port}")
+
+        self.metrics = ChannelMetrics(self.type)
+        self.metrics.add_gauge("unacked", lambda: self.unacked)
+
+    @property
+    def can_send(self) -> bool:
+        """Check whether this end of the channel is able to send messages."""
+        return not (self.mode == ChannelMode.PUSH_PULL and self.is_server)
+
+    @property
+    def can_receive(self) -> bool:
+        """Check whether this end of the channel currently expects messages."""
+        if self.mode == ChannelMode.PUSH_PULL:
+            return self.is_server
+        if self.mode == ChannelMode.REQUEST_REPLY and not self.is_server:
+            return self._awaiting_reply  # REQ sockets only receive the reply
+        return True
+
+    @property
+    def dropped(self) -> int:
+        """Number of messages dropped because a queue was full."""
+        return self.metrics.counters["dropped"]
+
+    @property
+    def unacked(self) -> int:
+        """Number of sent commands that have not been acknowledged yet."""
+        return len(self._unacked)
+
+    def add_listener(self, listener: Callable) -> None:
+        """Add a listener, which receives commands on each event.
+
+        Args:
+            listener: The listener to add.
+        """
+        logger.info(
+            f"Adding listener: {get_parent_class(listener)}.{listener.__name__}"
+        )
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable) -> None:
+        """Remove a listener.
+
+        Args:
+            listener: The listener to remove.
+        """
+        logger.info(
+            f"Removing listener: {get_parent_class(listener)}.{listener.__name__}"
+        )
+        self.listeners.remove(listener)
+
+    def _new_message(self, command: str, value: Optional[Any] = None) -> dict:
+        """Build a command message, with a sequence number if acknowledgements are enabled."""
+        if not self.can_send:
+            raise RuntimeError(f"{self.type} cannot send in {self.mode.value} mode.")
+
+        # The send time lets the receiver estimate the one-way latency
+        data: dict[str, Any] = {"command": command, "value": value, "ts": time.time()}
+        if self.acks:
+            self._seq += 1
+            data["seq"] = self._seq
+            self._unacked.add(self._seq)
+        return data
+
+    def _hello_message(self) -> Optional[dict]:
+        """Get the wire format offer to send at connect time, if one is needed."""
+        if self.is_server or self._active_format == self.wire_format:
+            return None
+        # Offer the binary schema versions, the reply selects the format
+        return {"command": "hello", "value": list(SUPPORTED_VERSIONS)}
+
+    def _encode(self, data: dict, wire_format: Optional[WireFormat] = None) -> bytes:
+        """Encode a message with the negotiated wire format and schema version."""
+        return encode_message(
+            data, wire_format or self._active_format, self._active_version
+        )
+
+    def _decode(self, frames: list[bytes]) -> tuple[dict, Optional[bytes]]:
+        """Decode a received message and update the receive metrics.
+
+        Returns:
+            tuple[dict, Optional[bytes]]: The message and the identity of the peer, if any.
+        """
+        self._last_received_at = time.time()
+        # ROUTER sockets prefix each message with the identity of the peer
+        identity = frames[0] if len(frames) > 1 else None
+        if identity is not None:
+            self._peer_identity = identity
+        data = decode_message(frames[-1])
+
+        self.metrics.count("messages_received")
+        self.metrics.count("bytes_received", len(frames[-1]))
+        if data.get("ts"):
+            self.metrics.record_one_way(data["ts"], self._last_received_at)
+        return data, identity
+
+    def _drop_undecodable(self, frames: list[bytes], error: Exception) -> None:
+        """Drop a message that cannot be decoded, e.g. from a peer with another schema.
+        A single bad message must not tear down the channel.
+        """
+        logger.warning(f"{self.type} dropped an undecodable message: {error}")
+        self.metrics.count("decode_errors")
+        if self.mode != ChannelMode.REQUEST_REPLY:
+            return
+        if self.is_server:
+            # REP sockets have to reply before they can receive the next request
+            self._reply(None, {"command": "status", "value": "error"})
+        else:
+            self._awaiting_reply = False  # The reply arrived, it is just unreadable
+
+    def _transmit(self, frames: list[bytes]) -> bool:
+        """Send a message without blocking and update the send metrics.
+
+        Returns:
+            bool: True if the message was sent, False if it was dropped.
+        """
+        if not self._send_frames(frames):
+            self.metrics.count("dropped")
+            return False
+        self.metrics.count("messages_sent")
+        self.metrics.count("bytes_sent", len(frames[-1]))
+        return True
+
+    def _tick(self) -> None:
+        """Send a heartbeat and log the metrics when they are due.
+        Must be called periodically from the thread or task that owns the socket.
+        """
+        now = time.monotonic()
+        if self.metrics_log_interval and now >= self._next_metrics_log:
+            self._next_metrics_log = now + self.metrics_log_interval
+            logger.info(self.metrics.summary())
+
+        if not self.heartbeat_interval or now < self._next_heartbeat:
+            return
+        # Heartbeats need a reply path, servers can only reach a peer that has sent something
+        if self.mode == ChannelMode.PUSH_PULL or self._awaiting_reply:
+            return
+        if self.is_server and (
+            self.mode != ChannelMode.DEALER_ROUTER or self._peer_identity is None
+        ):
+            return
+
+        self._next_heartbeat = now + self.heartbeat_interval
+        self._reply(
+            self._peer_identity if self.is_server else None,
+            {"command": "ping", "value": time.time()},
+        )
+        # REQ sockets have to receive the pong before sending the next command
+        self._awaiting_reply = self.mode == ChannelMode.REQUEST_REPLY
+
+    def _handle_control(self, data: dict, identity: Optional[bytes]) -> bool:
+        """Handle the control messages of the channel itself.
+
+        Returns:
+            bool: True if the message was consumed, False if it is a command for the listeners.
+        """
+        command, value = data.get("command"), data.get("value")
+        self._awaiting_reply = False
+
+        match command:
+            case "ack":
+                self._unacked.discard(value)
+            case "status":
+                pass
+            case "hello":
+                self._negotiate(identity, value)
+            case "ping":
+                self._reply(
+                    identity,
+                    {
+                        "command": "pong",
+                        "value": (value, self._last_received_at, time.time()),
+                    },
+                )
+            case "pong":
+                sent, peer_received, peer_sent = value
+                self.metrics.record_heartbeat(
+                    sent, peer_received, peer_sent, self._last_received_at
+                )
+            case _:
+                return False
+        return True
+
+    def _acknowledge(self, data: dict, identity: Optional[bytes]) -> None:
+        """Acknowledge a handled command, as required by the channel mode."""
+        if self.mode == ChannelMode.REQUEST_REPLY and self.is_server:
+            self._reply(identity, {"command": "status", "value": "ok"})
+        elif data.get("seq") is not None:
+            self._reply(identity, {"command": "ack", "value": data["seq"]})
+
+    def _negotiate(self, identity: Optional[bytes], value: Any) -> None:
+        """Handle the wire format negotiation on either side of the channel."""
+        if self.is_server:
+            # The reply to the offer is always JSON, so any client can read it
+            version = None
+            if self.wire_format == WireFormat.BINARY:
+                version = negotiate_version(value)
+            self._active_format = WireFormat.BINARY if version else WireFormat.JSON
+            self._active_version = version or PROTOCOL_VERSION
+            self._reply(
+                identity,
+                {"command": "hello", "value": version},
+                WireFormat.JSON,
+            )
+        else:
+            self._active_format = WireFormat.BINARY if value else WireFormat.JSON
+            self._active_version = value or PROTOCOL_VERSION
+        logger.info(
+            f"{self.type} negotiated the {self._active_format.value} wire format"
+        )
+
+    def _reply(
+        self,
+        identity: Optional[bytes],
+        data: dict,
+        wire_format: Optional[WireFormat] = None,
+    ) -> None:
+        """Send a message back to the peer a message was received from."""
+        if not self.can_send:
+            return
+        frames = [self._encode(data, wire_format)]
+        if identity is not None:
+            frames.insert(0, identity)
+        if not self._transmit(frames):
+            logger.warning(f"{self.type} dropped a reply, peer is not reading.")
+
+    def _send_frames(self, frames: list[bytes]) -> bool:
+        """
+        Send a message on the channel socket without blocking.
+        This method should be overridden by subclasses.
+
+        Returns:
+            bool: True if the message was sent, False if the high-water mark was reached.
+        """
+        raise NotImplementedError("Subclasses must implement this method")
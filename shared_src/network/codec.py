@@ -0,0 +1,184 @@
+import json
+import struct
+from enum import Enum
+from typing import Any, Callable
+
+from .core import logger
+
+
+class WireFormat(Enum):
+    """Enum to represent the encodings of the command channel."""
+
+    JSON = "json"  # Human-readable, for debugging
+    BINARY = "binary"  # Compact struct-packed schema
+
+
+# Version of the binary schema. Released versions never change, bump it whenever
+# a command is added or the layout of a command or of the header changes
+PROTOCOL_VERSION: int = 2
+SUPPORTED_VERSIONS: tuple[int, ...] = (1, 2)
+
+HEADERS: dict[int, struct.Struct] = {
+    1: struct.Struct("<BBI"),  # version, command id, sequence number (0 = none)
+    2: struct.Struct("<BBId"),  # ... and the send timestamp of the sender (0 = none)
+}
+# Commands without a dedicated layout are sent as a JSON envelope after the header
+GENERIC_COMMAND_ID: int = 0xFF
+
+# JSON messages always start with "{", binary messages with their version
+_JSON_PREFIX: int = ord("{")
+
+
+def _pack_struct(layout: struct.Struct) -> Callable[[Any], bytes]:
+    return lambda value: layout.pack(*value)
+
+
+def _unpack_struct(layout: struct.Struct) -> Callable[[bytes], Any]:
+    return lambda payload: layout.unpack(payload)
+
+
+def _pack_text(value: Any) -> bytes:
+    return str(value).encode()
+
+
+def _unpack_text(payload: bytes) -> str:
+    return payload.decode()
+
+
+def _pack_none(value: Any) -> bytes:
+    return b""
+
+
+def _unpack_none(payload: bytes) -> None:
+    return None
+
+
+_LANE_PAIR = struct.Struct("<bb")
+_UINT = struct.Struct("<I")
+# frame sequence number, number of transitions, followed by the lane pairs
+_BATCH_HEADER = struct.Struct("<IB")
+_TIMESTAMP = struct.Struct("<d")
+# ping sent, ping received and pong sent timestamps
+_PONG = struct.Struct("<ddd")
+
+
+def _pack_batch(value: Any) -> bytes:
+    frame_seq, transitions = value
+    return _BATCH_HEADER.pack(frame_seq, len(transitions)) + b"".join(
+        _LANE_PAIR.pack(*transition) for transition in transitions
+    )
+
+
+def _unpack_batch(payload: bytes) -> tuple[int, list[tuple[int, int]]]:
+    frame_seq, count = _BATCH_HEADER.unpack_from(payload)
+    transitions = list(_LANE_PAIR.iter_unpack(payload[_BATCH_HEADER.size :]))
+    if len(transitions) != count:
+        raise ValueError(f"Expected {count} transitions, got {len(transitions)}")
+    return frame_seq, transitions
+
+
+# command -> (command id, schema version it was added in, pack, unpack)
+# Commands newer than the negotiated version are sent as a JSON envelope
+COMMANDS: dict[str, tuple[int, int, Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "switch": (1, 1, _pack_struct(_LANE_PAIR), _unpack_struct(_LANE_PAIR)),
+    "exit": (2, 1, _pack_none, _unpack_none),
+    "status": (3, 1, _pack_text, _unpack_text),
+    "ack": (4, 1, lambda v: _UINT.pack(v), lambda p: _UINT.unpack(p)[0]),
+    "switch_batch": (5, 2, _pack_batch, _unpack_batch),
+    "ping": (6, 2, lambda v: _TIMESTAMP.pack(v), lambda p: _TIMESTAMP.unpack(p)[0]),
+    "pong": (7, 2, _pack_struct(_PONG), _unpack_struct(_PONG)),
+}
+_COMMANDS_BY_ID = {
+    command_id: (command, unpack)
+    for command, (command_id, _, _, unpack) in COMMANDS.items()
+}
+
+
+def _pack_header(version: int, command_id: int, data: dict) -> bytes:
+    if version == 1:
+        return HEADERS[1].pack(version, command_id, data.get("seq") or 0)
+    return HEADERS[version].pack(
+        version, command_id, data.get("seq") or 0, data.get("ts") or 0.0
+    )
+
+
+def encode_message(
+    data: dict,
+    wire_format: WireFormat = WireFormat.BINARY,
+    version: int = PROTOCOL_VERSION,
+) -> bytes:
+    """Encode a message of the command channel.
+
+    Args:
+        data (dict): The message, with "command", "value" and the optional "seq" and "ts".
+        wire_format (WireFormat): The encoding to use.
+        version (int): The binary schema version negotiated with the peer.
+
+    Returns:
+        bytes: The encoded message.
+    """
+    if wire_format == WireFormat.JSON:
+        return json.dumps(data).encode()
+
+    command, value = data.get("command"), data.get("value")
+    if command in COMMANDS and COMMANDS[command][1] <= version:
+        command_id, _, pack, _ = COMMANDS[command]
+        try:
+            return _pack_header(version, command_id, data) + pack(value)
+        except (struct.error, TypeError, ValueError):
+            pass  # The value does not fit the schema, fall back to the envelope
+    envelope = {"command": command, "value": value}
+    header = _pack_header(version, GENERIC_COMMAND_ID, data)
+    return header + json.dumps(envelope).encode()
+
+
+def decode_message(payload: bytes) -> dict:
+    """Decode a message of the command channel. The encoding is detected from the payload,
+    so a receiver understands both formats regardless of what was negotiated.
+
+    Args:
+        payload (bytes): The encoded message.
+
+    Returns:
+        dict: The message, with "command", "value" and the optional "seq" and "ts".
+    """
+    if not payload:
+        raise ValueError("Received an empty message.")
+    if payload[0] == _JSON_PREFIX:
+        return json.loads(payload)
+
+    version = payload[0]
+    if version not in SUPPORTED_VERSIONS:
+        logger.error(f"Unsupported wire format version: {version}")
+        raise ValueError(f"Unsupported wire format version: {version}")
+
+    header = HEADERS[version]
+    _, command_id, seq, *timestamp = header.unpack_from(payload)
+    body = payload[header.size :]
+    if command_id == GENERIC_COMMAND_ID:
+        data = json.loads(body)
+    elif command_id in _COMMANDS_BY_ID:
+        command, unpack = _COMMANDS_BY_ID[command_id]
+        data = {"command": command, "value": unpack(body)}
+    else:
+        logger.error(f"Unknown command id: {command_id}")
+        raise ValueError(f"Unknown command id: {command_id}")
+
+    if seq:
+        data["seq"] = seq
+    if timestamp and timestamp[0]:
+        data["ts"] = timestamp[0]
+    return data
+
+
+def negotiate_version(offered: list[int]) -> int | None:
+    """Select the highest binary schema version supported by both peers.
+
+    Args:
+        offered (list[int]): The versions the peer supports.
+
+    Returns:
+        int | None: The selected version, or None if there is none in common.
+    """
+    common = set(offered or ()) & set(SUPPORTED_VERSIONS)
+    return max(common) if common else None
@@ -35,10 +35,14 @@ NETWORK_CONFIG: dict = {
         "gstreamer": int(os.environ.get("GSTREAMER_PORT", 0)),
         "zmq": int(os.environ.get("ZMQ_PORT", 0)),
         "display_server": int(os.environ.get("DISPLAY_SERVER_PORT", 0)),
+        "metrics": int(os.environ.get("METRICS_PORT", 0)),
     },
     "vars": {
         "handshake": os.environ.get("HANDSHAKE_SECRET", "default"),
         "cudacodec_enabled": os.environ.get("CUDA_CODEC_ENABLED", "false").lower()
         == "true",
+        "zmq_mode": os.environ.get("ZMQ_MODE", "dealer_router"),
+        "zmq_wire_format": os.environ.get("ZMQ_WIRE_FORMAT", "binary"),
+        "zmq_acks": os.environ.get("ZMQ_ACKS", "false").lower() == "true",
     },
 }
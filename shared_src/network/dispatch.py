@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .core import logger
+from .metrics import ChannelMetrics, LatencyHistogram
+
+
+class _ListenerQueue:
+    """The pending calls of one listener and its latency histogram."""
+
+    def __init__(self, listener: Callable) -> None:
+        self.name = getattr(listener, "__qualname__", repr(listener))
+        self.calls: deque[tuple[float, tuple, Optional[Callable[[Any], None]]]] = (
+            deque()
+        )
+        self.scheduled = False
+        self.latency = LatencyHistogram(f"listener {self.name}")
+
+
+class ListenerDispatcher:
+    """
+    Runs the listeners of a channel on a bounded worker pool, so the channel thread
+    never waits on a consumer. Each listener has its own bounded queue and receives
+    its calls in order, one at a time, while different listeners run concurrently.
+    """
+
+    def __init__(
+        self,
+        metrics: ChannelMetrics,
+        max_workers: int = 4,
+        queue_size: int = 100,
+        timeout: float = 0.5,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        """Initialize the dispatcher.
+
+        Args:
+            metrics (ChannelMetrics): The metrics of the channel the listeners belong to.
+            max_workers (int): Maximum number of listeners running at the same time.
+            queue_size (int): Maximum number of pending calls per listener.
+                Calls beyond it are dropped instead of blocking the channel thread.
+            timeout (float): Seconds after which a call is reported as timed out.
+                Threads cannot be interrupted, so the call keeps running, but the calls
+                queued behind it are dropped once the queue is full.
+            on_error (Callable, optional): Called on the worker when a listener raises,
+                e.g. to wake up the channel thread.
+        """
+        self.metrics = metrics
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.exception: Optional[Exception] = None
+        self._on_error = on_error
+        self.queue_wait = LatencyHistogram("listener queue wait")
+        self._queues: dict[Callable, _ListenerQueue] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ListenerDispatcher"
+        )
+        self.metrics.add_gauge("listener_backlog", self.backlog)
+        self.metrics.add_histogram(self.queue_wait)
+
+    def backlog(self) -> int:
+        """Number of calls waiting for their listener."""
+        with self._lock:
+            return sum(len(q.calls) for q in self._queues.values())
+
+    def submit(
+        self,
+        listener: Callable,
+        *args: Any,
+        on_result: Optional[Callable[[Any], None]] = None,
+    ) -> bool:
+        """Queue a call of a listener. This never blocks.
+
+        Args:
+            listener (Callable): The listener to call.
+            *args: The arguments of the call.
+            on_result (Callable, optional): Called on the worker with the return value.
+
+        Returns:
+            bool: True if the call was queued, False if it was dropped.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if (listener_queue := self._queues.get(listener)) is None:
+                listener_queue = self._queues[listener] = _ListenerQueue(listener)
+                self.metrics.add_histogram(listener_queue.latency)
+            if len(listener_queue.calls) >= self.queue_size:
+                self.metrics.count("listener_dropped")
+                logger.warning(
+                    f"Listener {listener_queue.name} is falling behind, dropping a call."
+                )
+                return False
+            listener_queue.calls.append((time.perf_counter(), args, on_result))
+            if listener_queue.scheduled:
+                return True  # The running worker picks it up
+            listener_queue.scheduled = True
+        self._executor.submit(self._drain, listener, listener_queue)
+        return True
+
+    def _drain(self, listener: Callable, listener_queue: _ListenerQueue) -> None:
+        """Run the queued calls of a listener in order until its queue is empty."""
+        while True:
+            with self._lock:
+                if not listener_queue.calls or self._closed:
+                    listener_queue.scheduled = False
+                    return
+                queued_at, args, on_result = listener_queue.calls.popleft()
+
+            started = time.perf_counter()
+            self.queue_wait.record(started - queued_at)
+            try:
+                res = listener(*args)
+                if on_result is not None:
+                    on_result(res)
+            except Exception as e:
+                self.metrics.count("listener_errors")
+                logger.error(f"Listener {listener_queue.name} failed: {e}")
+                # The first error is raised on the channel thread for reconnect logic
+                if self.exception is None:
+                    self.exception = e
+                    if self._on_error is not None:
+                        self._on_error(e)
+            finally:
+                elapsed = time.perf_counter() - started
+                listener_queue.latency.record(elapsed)
+                if elapsed > self.timeout:
+                    self.metrics.count("listener_timeouts")
+                    logger.warning(
+                        f"Listener {listener_queue.name} took {elapsed:.3f}s, "
+                        f"exceeding its timeout of {self.timeout}s."
+                    )
+
+    def shutdown(self) -> None:
+        """Drop the pending calls and stop the workers without waiting for running calls."""
+        with self._lock:
+            self._closed = True
+            for listener_queue in self._queues.values():
+                listener_queue.calls.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def summary(self) -> str:
+        """Get a one-line summary of the listener latencies."""
+        with self._lock:
+            histograms = [q.latency for q in self._queues.values()]
+        return " | ".join(h.summary() for h in (self.queue_wait, *histograms))
@@ -0,0 +1,306 @@
+import bisect
+import json
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+from ..common import StoppableThread
+from .core import logger
+
+# Upper bounds of the histogram buckets in seconds, log-spaced from 10µs to 10s
+LATENCY_BUCKETS: tuple[float, ...] = tuple(
+    base * 10**exp for exp in range(-5, 1) for base in (1, 2, 5)
+) + (10.0,)
+
+
+class LatencyHistogram:
+    """A thread-safe, fixed-bucket latency histogram."""
+
+    def __init__(self, name: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize the histogram.
+
+        Args:
+            name (str): The name of the histogram, used in summaries.
+            buckets (tuple[float, ...]): Ascending upper bounds of the buckets in seconds.
+        """
+        self.name = name
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all recorded samples."""
+        with self._lock:
+            # The last bucket collects everything above the largest bound
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Record a latency sample.
+
+        Args:
+            seconds (float): The latency in seconds.
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        """Mean latency in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Estimate a percentile as the upper bound of the bucket it falls into.
+
+        Args:
+            p (float): The percentile in [0, 100].
+
+        Returns:
+            float: The estimated latency in seconds.
+        """
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = p / 100 * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    bound = (
+                        self.buckets[index] if index < len(self.buckets) else self.max
+                    )
+                    return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> str:
+        """Get a one-line summary of the histogram."""
+        return (
+            f"{self.name}: n={self.count}, mean={self.mean * 1000:.3f}ms, "
+            f"p50<={self.percentile(50) * 1000:.3f}ms, p99<={self.percentile(99) * 1000:.3f}ms, "
+            f"max={self.max * 1000:.3f}ms"
+        )
+
+    def snapshot(self) -> dict[str, float]:
+        """Get the statistics of the histogram in milliseconds."""
+        return {
+            "count": self.count,
+            "mean_ms": self.mean * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class ChannelMetrics:
+    """
+    Counters, gauges and latency histograms of one end of the command channel.
+    The clock offset to the peer is estimated from heartbeat round trips, like NTP,
+    using the sample with the smallest round trip time of a recent window.
+    """
+
+    def __init__(self, name: str, offset_window: int = 16) -> None:
+        """Initialize the metrics.
+
+        Args:
+            name (str): The name of the channel end, used in summaries.
+            offset_window (int): Number of recent heartbeats the clock offset is estimated from.
+        """
+        self.name = name
+        self.started = time.monotonic()
+        self.counters: Counter[str] = Counter()
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.send_latency = LatencyHistogram("send latency")
+        self.dispatch_latency = LatencyHistogram("dispatch latency")
+        self.round_trip = LatencyHistogram("round trip")
+        self.one_way_latency = LatencyHistogram("one-way latency")
+        self.histograms: list[LatencyHistogram] = [
+            self.send_latency,
+            self.dispatch_latency,
+            self.round_trip,
+            self.one_way_latency,
+        ]
+        self._lock = threading.Lock()
+        self._offset_samples: deque[tuple[float, float]] = deque(maxlen=offset_window)
+        self._last_log = (self.started, Counter())
+
+    @property
+    def clock_offset(self) -> Optional[float]:
+        """Estimated clock of the peer minus the local clock in seconds, None if unknown."""
+        with self._lock:
+            if not self._offset_samples:
+                return None
+            return min(self._offset_samples)[1]
+
+    def count(self, key: str, amount: int = 1) -> None:
+        """Increase a counter.
+
+        Args:
+            key (str): The name of the counter.
+            amount (int): The amount to add.
+        """
+        with self._lock:
+            self.counters[key] += amount
+
+    def add_gauge(self, key: str, gauge: Callable[[], float]) -> None:
+        """Register a gauge, which is read whenever a snapshot is taken.
+
+        Args:
+            key (str): The name of the gauge.
+            gauge (Callable[[], float]): A function that returns the current value.
+        """
+        self.gauges[key] = gauge
+
+    def add_histogram(self, histogram: LatencyHistogram) -> None:
+        """Register an additional histogram, which is included in snapshots.
+
+        Args:
+            histogram (LatencyHistogram): The histogram to add.
+        """
+        self.histograms.append(histogram)
+
+    def record_heartbeat(
+        self, sent: float, peer_received: float, peer_sent: float, received: float
+    ) -> None:
+        """Record a heartbeat round trip.
+
+        Args:
+            sent (float): Local time the ping was sent.
+            peer_received (float): Peer time the ping was received.
+            peer_sent (float): Peer time the pong was sent.
+            received (float): Local time the pong was received.
+        """
+        round_trip = (received - sent) - (peer_sent - peer_received)
+        offset = ((peer_received - sent) + (peer_sent - received)) / 2
+        self.round_trip.record(max(round_trip, 0.0))
+        with self._lock:
+            self._offset_samples.append((round_trip, offset))
+
+    def record_one_way(self, peer_sent: float, received: float) -> None:
+        """Record the one-way latency of a message stamped by the peer.
+        Without an offset estimate, the clocks are assumed to be synchronized.
+
+        Args:
+            peer_sent (float): Peer time the message was sent.
+            received (float): Local time the message was received.
+        """
+        offset = self.clock_offset or 0.0
+        self.one_way_latency.record(max(received - peer_sent + offset, 0.0))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the current values of all metrics."""
+        uptime = time.monotonic() - self.started
+        with self._lock:
+            counters = dict(self.counters)
+        offset = self.clock_offset
+        return {
+            "uptime_sec": uptime,
+            "counters": counters,
+            "rates_per_sec": (
+                {k: v / uptime for k, v in counters.items()} if uptime else {}
+            ),
+            "gauges": {k: gauge() for k, gauge in self.gauges.items()},
+            "clock_offset_ms": offset * 1000 if offset is not None else None,
+            "latency": {h.name: h.snapshot() for h in list(self.histograms)},
+        }
+
+    def summary(self) -> str:
+        """Get a one-line summary of the rates since the last summary and the latencies."""
+        now = time.monotonic()
+        with self._lock:
+            counters = Counter(self.counters)
+        last_time, last_counters = self._last_log
+        self._last_log = (now, counters)
+        elapsed = max(now - last_time, 1e-9)
+        rates = ", ".join(
+            f"{k}={(counters[k] - last_counters[k]) / elapsed:.1f}/s"
+            for k in (
+                "messages_sent",
+                "messages_received",
+                "bytes_sent",
+                "bytes_received",
+            )
+        )
+        gauges = ", ".join(f"{k}={gauge()}" for k, gauge in self.gauges.items())
+        offset = self.clock_offset
+        offset_str = f"{offset * 1000:.3f}ms" if offset is not None else "unknown"
+        return (
+            f"{self.name}: {rates}, dropped={counters['dropped']}, {gauges}, "
+            f"clock offset={offset_str} | {self.round_trip.summary()} | "
+            f"{self.one_way_latency.summary()}"
+        )
+
+
+class MetricsServer(StoppableThread):
+    """A thread that serves the registered metrics as JSON on a local HTTP endpoint."""
+
+    def __init__(self, port: int, *args, host: str = "127.0.0.1", **kwargs) -> None:
+        """Initialize the metrics server.
+
+        Args:
+            port (int): The port to bind to.
+            host (str): The address to bind to, only the local host by default.
+        """
+        super().__init__(*args, **kwargs)
+        self.providers: dict[str, Callable[[], dict]] = {}
+        providers = self.providers
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(
+                    {name: provider() for name, provider in list(providers.items())},
+                    default=str,
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(f"MetricsServer: {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        logger.info(f"MetricsServer listening on http://{host}:{port}/metrics")
+
+    def register(self, name: str, provider: Callable[[], dict]) -> None:
+        """Register a metrics provider, e.g. `ChannelMetrics.snapshot`.
+
+        Args:
+            name (str): The key of the provider in the response.
+            provider (Callable[[], dict]): A function that returns the metrics.
+        """
+        self.providers[name] = provider
+
+    def unregister(self, name: str) -> None:
+        """Remove a metrics provider.
+
+        Args:
+            name (str): The key of the provider.
+        """
+        self.providers.pop(name, None)
+
+    def run_with_exception_handling(self) -> None:
+        try:
+            self._server.serve_forever(poll_interval=0.5)
+        except Exception as e:
+            logger.error(f"MetricsServer encountered an error: {e}")
+            raise
+
+    def dispose(self) -> None:
+        """Stop the server and release its port."""
+        self.stop()
+        self._server.shutdown()
+        self._server.server_close()
+        logger.info("MetricsServer disposed.")
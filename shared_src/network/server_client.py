@@ -1,13 +1,24 @@
-from typing import Any, Callable, Optional
+import queue
+import struct
+import threading
+import time
+from functools import partial
+from typing import Any, Optional
 
 import zmq
 
-from ..common import StoppableThread, get_parent_class
+from ..common import StoppableThread
+from .channel import ChannelMode, CommandChannel
+from .codec import WireFormat
 from .core import logger
+from .dispatch import ListenerDispatcher
 
 
-class ServerClient(StoppableThread):
-    """A thread that runs a ZeroMQ server/client to send and receive commands."""
+class ServerClient(CommandChannel, StoppableThread):
+    """
+    A thread that runs a ZeroMQ server/client to send and receive commands.
+    Listeners are called on a worker pool, so a slow consumer never stalls the socket.
+    """
 
     def __init__(
         self,
@@ -15,110 +26,260 @@ class ServerClient(StoppableThread):
         *args,
         is_server: bool = True,
         server_ip: Optional[str] = None,
+        mode: ChannelMode = ChannelMode.DEALER_ROUTER,
+        high_water_mark: int = 100,
+        conflate: bool = False,
+        acks: bool = False,
+        poll_timeout_ms: int = 1000,
+        wire_format: WireFormat = WireFormat.BINARY,
+        heartbeat_interval: float = 1.0,
+        metrics_log_interval: float = 60.0,
+        listener_workers: int = 4,
+        listener_timeout: float = 0.5,
         **kwargs,
     ) -> None:
         """Initialize the server/client thread.
 
         Args:
             port (int): The port to bind to.
+            is_server (bool): Whether to bind (server) or connect (client).
+            server_ip (str, optional): The IP of the server, required in client mode.
+            mode (ChannelMode): The messaging pattern of the channel.
+            high_water_mark (int): Maximum number of queued messages per direction.
+                Commands beyond it are dropped instead of blocking the sender.
+            conflate (bool): Keep only the latest message (push/pull mode only),
+                for channels that carry latest-state messages.
+            acks (bool): Request an acknowledgement for each command (dealer/router mode only).
+            poll_timeout_ms (int): Maximum time the channel thread sleeps between checks
+                of its stop flag. It wakes up earlier on traffic, queued sends and disposal.
+            wire_format (WireFormat): The preferred encoding. The binary format is negotiated
+                with the server at connect time, JSON is used until then or if the server
+                does not support it. Push/pull channels have no reply path and use it directly.
+            heartbeat_interval (float): Seconds between heartbeats, which measure the round trip
+                and the clock offset to the peer. 0 disables them.
+            metrics_log_interval (float): Seconds between metrics summaries in the log. 0 disables them.
+            listener_workers (int): Maximum number of listeners running at the same time.
+                Listeners run on a worker pool, each one receives its commands in order.
+            listener_timeout (float): Seconds after which a listener call is reported as slow.
         """
-        super().__init__(*args, **kwargs)
-
+        StoppableThread.__init__(self, *args, **kwargs)
         self._disposed = False
-        self.listeners: list[Callable] = []
-        self.port = port
-        self._context = zmq.Context()
-        self._socket = self._context.socket(zmq.REP)
-        if is_server:
-            self.type = "ZeroMQ server"
-            self._socket.bind(f"tcp://*:{self.port}")
-        else:
-            self.type = "ZeroMQ client"
-            self.server_ip = server_ip
-            if not self.server_ip:
-                raise ValueError("Server IP is required for client mode.")
-            self._socket.connect(f"tcp://{self.server_ip}:{self.port}")
-
-        logger.info(f"{self.type} started on port {self.port}")
-        logger.info("Waiting for commands...")
-
-    def add_listener(self, listener: Callable) -> None:
-        """Add a listener, which receives commands on each event.
-
-        Args:
-            listener: The listener to add.
-        """
-        logger.info(
-            f"Adding listener: {get_parent_class(listener)}.{listener.__name__}"
+        self.poll_timeout_ms = poll_timeout_ms
+        self._outbox: queue.Queue[tuple[float, list[bytes]]] = queue.Queue(
+            maxsize=high_water_mark
+        )
+        self._init_channel(
+            zmq.Context(),
+            port,
+            is_server,
+            server_ip,
+            mode,
+            high_water_mark,
+            conflate,
+            acks,
+            wire_format,
+            heartbeat_interval,
+            metrics_log_interval,
+        )
+        self.metrics.add_gauge("outbox_depth", self._outbox.qsize)
+        self._dispatcher = ListenerDispatcher(
+            self.metrics,
+            max_workers=listener_workers,
+            queue_size=high_water_mark,
+            timeout=listener_timeout,
+            on_error=lambda _: self._wake(),
         )
-        self.listeners.append(listener)
 
-    def remove_listener(self, listener: Callable) -> None:
-        """Remove a listener.
+        # Other threads wake the channel thread through an inproc pair instead of
+        # touching the channel socket, which is owned by the channel thread
+        wake_address = f"inproc://server-client-wake-{id(self)}"
+        self._wake_lock = threading.Lock()
+        self._wake_receiver = self._context.socket(zmq.PAIR)
+        self._wake_receiver.bind(wake_address)
+        self._wake_sender = self._context.socket(zmq.PAIR)
+        self._wake_sender.connect(wake_address)
 
-        Args:
-            listener: The listener to remove.
-        """
-        logger.info(
-            f"Removing listener: {get_parent_class(listener)}.{listener.__name__}"
-        )
-        self.listeners.remove(listener)
+        logger.info(f"{self.type} started on port {self.port} ({self.mode.value})")
+        logger.info("Waiting for commands...")
 
     def run_with_exception_handling(self) -> None:
+        poller = zmq.Poller()
+        poller.register(self._wake_receiver, zmq.POLLIN)
+        timeout_ms = self.poll_timeout_ms
+        if self.heartbeat_interval:
+            timeout_ms = min(timeout_ms, int(self.heartbeat_interval * 1000))
+        if hello := self._hello_message():
+            self._enqueue(hello)
         try:
             while self.running:
+                if self._dispatcher.exception:
+                    raise self._dispatcher.exception
+                self._tick()
+                self._flush_outbox()
+                # Only poll the channel socket if it can receive in its current state,
+                # registering with no flags removes it from the poller
+                poller.register(self._socket, zmq.POLLIN if self.can_receive else 0)
+                events = dict(poller.poll(timeout_ms))
+
+                if self._wake_receiver in events:
+                    self._drain_wake_signals()
+                if self._socket not in events:
+                    continue
+                woke = time.perf_counter()
+
                 try:
-                    data = self._socket.recv_json(flags=zmq.NOBLOCK)
+                    frames = self._socket.recv_multipart(flags=zmq.NOBLOCK)
                 except zmq.Again:
-                    continue  # No message, keep looping
+                    continue
                 except zmq.ZMQError as e:
                     logger.error(f"{self.type} error: {e}")
                     raise ConnectionError(f"{self.type} connection lost: {e}")
 
-                command, value = data.get("command"), data.get("value")
-
-                if command == "exit":
-                    logger.info(f"Exit command received, shutting down {self.type}.")
-                    break
-
-                for listener in self.listeners:
-                    res = listener(command, value)
-                    if res:
-                        command, value = res
-                        self._socket.send_json({"command": command, "value": value})
-
                 try:
-                    self._socket.send_json({"command": "status", "value": "ok"})
-                except zmq.ZMQError as e:
-                    logger.error(f"{self.type} failed to send response: {e}")
-                    raise ConnectionError(f"{self.type} send failed: {e}")
+                    data, identity = self._decode(frames)
+                except (ValueError, struct.error) as e:
+                    self._drop_undecodable(frames, e)
+                    continue
+                keep_running = self._handle(data, identity)
+                self.metrics.dispatch_latency.record(time.perf_counter() - woke)
+                if not keep_running:
+                    break
 
         except Exception as e:
             logger.error(f"{self.type} encountered an error: {e}")
             raise  # Propagate the error for reconnect logic
 
         finally:
-            self.dispose()
+            self._close()
+
+    def _wake(self) -> None:
+        """Wake up the channel thread, e.g. to send queued commands or to shut down."""
+        with self._wake_lock:
+            if self._disposed:
+                return
+            try:
+                self._wake_sender.send(b"", flags=zmq.NOBLOCK)
+            except zmq.Again:
+                pass  # Enough wake-up signals are pending already
 
-    def send(self, command: str, value: Optional[Any] = None) -> None:
-        """Send a command to the server.
+    def _drain_wake_signals(self) -> None:
+        """Consume all pending wake-up signals."""
+        while True:
+            try:
+                self._wake_receiver.recv(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+    def _handle(self, data: dict, identity: Optional[bytes]) -> bool:
+        """Handle a received message.
+
+        Returns:
+            bool: False if the channel should shut down, True otherwise.
+        """
+        if self._handle_control(data, identity):
+            return True
+
+        command, value = data.get("command"), data.get("value")
+        if command == "exit":
+            logger.info(f"Exit command received, shutting down {self.type}.")
+            self._reply(identity, {"command": "status", "value": "ok"})
+            return False
+
+        # Listeners run on the dispatcher, their replies are queued for the channel thread.
+        # REP sockets only allow the status reply, which is sent right away.
+        on_result = None
+        if self.can_send and not (
+            self.mode == ChannelMode.REQUEST_REPLY and self.is_server
+        ):
+            on_result = partial(self._queue_reply, identity)
+        for listener in self.listeners:
+            self._dispatcher.submit(listener, command, value, on_result=on_result)
+
+        # Commands are acknowledged once they are handed to the listeners
+        self._acknowledge(data, identity)
+        return True
+
+    def _queue_reply(self, identity: Optional[bytes], res: Any) -> None:
+        """Queue the reply of a listener, if it returned one."""
+        if res:
+            command, value = res
+            self._enqueue({"command": command, "value": value}, identity)
+
+    def _send_frames(self, frames: list[bytes]) -> bool:
+        try:
+            self._socket.send_multipart(frames, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        except zmq.ZMQError as e:
+            logger.error(f"{self.type} failed to send message: {e}")
+            raise ConnectionError(f"{self.type} send failed: {e}")
+        return True
+
+    def _flush_outbox(self) -> None:
+        """Send queued commands without blocking. Only the channel thread touches the socket."""
+        while not self._awaiting_reply:
+            try:
+                queued_at, frames = self._outbox.get_nowait()
+            except queue.Empty:
+                return
+            if not self._transmit(frames):
+                logger.warning(f"{self.type} dropped a command, peer is not reading.")
+                continue
+            self.metrics.send_latency.record(time.perf_counter() - queued_at)
+            # REQ sockets have to receive the reply before sending the next command
+            self._awaiting_reply = self.mode == ChannelMode.REQUEST_REPLY
+
+    def send(self, command: str, value: Optional[Any] = None) -> bool:
+        """Send a command to the server. This never blocks, the command is queued and
+        sent by the channel thread.
         Args:
             command (str): The command to send.
             value (Any, optional): The value associated with the command.
+        Returns:
+            bool: True if the command was queued, False if it was dropped.
         """
+        return self._enqueue(self._new_message(command, value))
+
+    def _enqueue(self, data: dict, identity: Optional[bytes] = None) -> bool:
+        """Encode a message and queue it for the channel thread."""
+        frames = [self._encode(data)]
+        if identity is not None:
+            frames.insert(0, identity)
         try:
-            self._socket.send_json({"command": command, "value": value})
-        except zmq.ZMQError as e:
-            logger.error(f"{self.type} failed to send command: {e}")
-            raise ConnectionError(f"{self.type} send failed: {e}")
+            self._outbox.put_nowait((time.perf_counter(), frames))
+        except queue.Full:
+            self.metrics.count("dropped")
+            logger.warning(
+                f"{self.type} outbox full, dropping command '{data['command']}'."
+            )
+            return False
+        self._wake()
+        return True
 
     def dispose(self) -> None:
-        """Clean up the resources."""
-        if self._disposed:
-            return
-        self._disposed = True
+        """Stop the thread and clean up the resources.
+        If the channel thread is running, it closes the sockets itself once it wakes up.
+        """
         self.stop()
+        self._wake()
+        if self.is_alive() and threading.current_thread() is not self:
+            return
+        self._close()
+
+    def _close(self) -> None:
+        """Close the sockets and the context."""
+        with self._wake_lock:
+            if self._disposed:
+                return
+            self._disposed = True
         self.listeners.clear()
+        self._dispatcher.shutdown()
         self._socket.close()
+        self._wake_sender.close()
+        self._wake_receiver.close()
         self._context.term()
+        logger.info(self.metrics.summary())
+        logger.info(f"{self.type} {self.metrics.send_latency.summary()}")
+        logger.info(f"{self.type} {self.metrics.dispatch_latency.summary()}")
+        logger.info(f"{self.type} {self._dispatcher.summary()}")
         logger.info(f"{self.type} disposed.")
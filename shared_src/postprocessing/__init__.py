@@ -1,4 +1,15 @@
 from .core import logger
-from .model_export import export_model_to_onnx, export_model_to_trt
+from .model_export import (
+    export_model_to_onnx,
+    export_model_to_trt,
+    optimize_onnx_model,
+    quantize_onnx_model,
+)
 
-__all__ = ["export_model_to_onnx", "export_model_to_trt", "logger"]
+__all__ = [
+    "export_model_to_onnx",
+    "export_model_to_trt",
+    "optimize_onnx_model",
+    "quantize_onnx_model",
+    "logger",
+]
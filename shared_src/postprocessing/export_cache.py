@@ -0,0 +1,107 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Optional
+
+import torch
+
+from ..common import Config, get_file_hash
+from .core import logger
+
+CACHE_DIR: Path = Path(Config.get("global_cache_dir"), "exports")
+
+
+def get_toolchain_versions() -> dict[str, str]:
+    """Get the versions of the tools that influence the exported artifacts."""
+    versions = {"torch": torch.__version__}
+    try:
+        import onnx
+
+        versions["onnx"] = onnx.__version__
+    except ImportError:
+        versions["onnx"] = "unknown"
+    try:
+        import tensorrt
+
+        versions["tensorrt"] = tensorrt.__version__
+    except ImportError:
+        versions["tensorrt"] = "unknown"
+    return versions
+
+
+def hash_state_dict(model: torch.nn.Module, hash_func: Any) -> None:
+    """Feed the names, data types, shapes and values of a model's state dict into a hash."""
+    for name, tensor in sorted(model.state_dict().items()):
+        tensor = tensor.detach().cpu().contiguous().reshape(-1)
+        hash_func.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+        hash_func.update(tensor.view(torch.uint8).numpy().tobytes())
+
+
+def get_export_key(
+    weights: torch.nn.Module | Path,
+    dummy_input: Optional[tuple[torch.Tensor, ...]] = None,
+    **export_options: Any,
+) -> str:
+    """
+    Compute the content address of an export, i.e. a hash of the model weights,
+    the input signature, the export options and the toolchain versions.
+
+    Args:
+        weights (torch.nn.Module | Path): The model to export, or its weights file.
+        dummy_input (tuple[torch.Tensor, ...], optional): The dummy input of the export.
+        export_options: Any further options that influence the artifact
+            (e.g. input/output names, dynamic axes, shapes, opset).
+    """
+    hash_func = hashlib.sha256()
+    if isinstance(weights, Path):
+        hash_func.update(get_file_hash(weights).encode())
+    else:
+        hash_state_dict(weights, hash_func)
+    metadata = {
+        "inputs": [(str(t.dtype), tuple(t.shape)) for t in dummy_input or ()],
+        "options": export_options,
+        "toolchain": get_toolchain_versions(),
+    }
+    hash_func.update(json.dumps(metadata, sort_keys=True, default=str).encode())
+    return hash_func.hexdigest()
+
+
+def load_from_cache(key: str, save_path: Path) -> Optional[Path]:
+    """
+    Copy a cached artifact to the save path.
+
+    Args:
+        key (str): The content address of the artifact.
+        save_path (Path): The path to copy the artifact to. Its suffix selects the artifact.
+
+    Returns:
+        Path: The save path on a cache hit, None otherwise.
+    """
+    cached_path = Path(CACHE_DIR, key, f"model{save_path.suffix}")
+    if not cached_path.is_file():
+        logger.debug(f"Export cache miss: {key}{save_path.suffix}")
+        return None
+
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    if cached_path.resolve() != save_path.resolve():
+        shutil.copy(cached_path, save_path)
+    logger.info(f"Export cache hit, using cached artifact for '{save_path}'")
+    return save_path
+
+
+def store_in_cache(key: str, artifact_path: Path) -> None:
+    """
+    Store an exported artifact in the cache.
+
+    Args:
+        key (str): The content address of the artifact.
+        artifact_path (Path): The path of the exported artifact.
+    """
+    cached_path = Path(CACHE_DIR, key, f"model{artifact_path.suffix}")
+    cached_path.parent.mkdir(parents=True, exist_ok=True)
+    # Copy to a temporary file first, so concurrent exports never read partial artifacts
+    temp_path = cached_path.with_suffix(cached_path.suffix + ".tmp")
+    shutil.copy(artifact_path, temp_path)
+    temp_path.replace(cached_path)
+    logger.debug(f"Stored '{artifact_path}' in the export cache: {key}")
@@ -1,27 +1,41 @@
 import warnings
 
-from shared_src.common import IS_DEBUG
+from shared_src.common import IS_DEBUG, get_file_hash
 
 warnings.filterwarnings("ignore", category=FutureWarning, module="onnxscript")
 warnings.filterwarnings("ignore", category=UserWarning, message=".*dynamic_axes.*")
 
+import json
 import subprocess as sp
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
+import numpy as np
 import torch
 from ultralytics import YOLO
 
 from .core import logger
+from .export_cache import get_export_key, load_from_cache, store_in_cache
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+OPSET_VERSION: int = 18
+
+# Tracing a model for export is not thread-safe, so exports from several threads
+# trace one at a time
+_ONNX_EXPORT_LOCK = threading.Lock()
 
 try:
     from ai.vehicle_detection import MODULE_CONFIG as INFERENCE_CONFIG
 
-    def __load_int8_calibration_data() -> Path:
+    def __get_int8_calibration_archive() -> Path:
         dataset_config = INFERENCE_CONFIG.get("dataset", {})
-        dataset_path = Path(dataset_config.get("path"))
+        return Path(dataset_config.get("path"))
+
+    def __load_int8_calibration_data() -> Path:
+        dataset_path = __get_int8_calibration_archive()
         dataset_path = unpack_dataset(dataset_path, "vehicle_detection")
         return Path(dataset_path, "data.yaml")
 
@@ -38,9 +52,11 @@ def export_model_to_onnx(
     input_names: Optional[list[str]] = None,
     output_names: Optional[list[str]] = None,
     dynamic_axes: Optional[dict[str, dict[int, str]]] = None,
+    use_cache: bool = True,
 ):
     """
     Export a PyTorch model to ONNX format.
+    Unchanged models are served from the export cache.
 
     Args:
         model (torch.nn.Module): The PyTorch model to export.
@@ -49,24 +65,42 @@ def export_model_to_onnx(
         input_names (list[str], optional): The names of the input tensors.
         output_names (list[str], optional): The names of the output tensors.
         dynamic_axes (dict[str, dict[int, str]], optional): Dynamic axes for the model.
+        use_cache (bool): Whether to look up and store the artifact in the export cache.
     """
-    model = model.eval().to(DEVICE)
-
-    # Export the model to ONNX format
-    logger.info("Exporting the model to ONNX format...")
-    torch.onnx.export(
+    key = get_export_key(
         model,
         dummy_input,
-        save_path,
-        verbose=IS_DEBUG,
-        export_params=True,
-        optimize=True,
-        dynamo=True,
-        opset_version=18,
+        format="onnx",
         input_names=input_names,
         output_names=output_names,
         dynamic_axes=dynamic_axes,
+        opset_version=OPSET_VERSION,
     )
+    if use_cache and load_from_cache(key, save_path):
+        return save_path
+
+    model = model.eval().to(DEVICE)
+
+    # Export the model to ONNX format
+    logger.info("Exporting the model to ONNX format...")
+    with _ONNX_EXPORT_LOCK:
+        torch.onnx.export(
+            model,
+            dummy_input,
+            save_path,
+            verbose=IS_DEBUG,
+            export_params=True,
+            external_data=False,  # Keep the weights in the file, so artifacts stay self-contained
+            optimize=True,
+            dynamo=True,
+            opset_version=OPSET_VERSION,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+        )
+
+    if use_cache:
+        store_in_cache(key, save_path)
 
     logger.info(f"ONNX model exported to '{save_path}'!")
     return save_path
@@ -80,9 +114,11 @@ def export_model_to_trt(
     output_names: Optional[list[str]] = None,
     dynamic_axes: Optional[dict[str, dict[int, str]]] = None,
     shapes: Optional[dict[str, str | None]] = None,
+    use_cache: bool = True,
 ) -> Path:
     """
     Export a PyTorch model to TensorRT format.
+    Unchanged models are served from the export cache.
     Args:
         model (torch.nn.Module | YOLO): The PyTorch model to export.
         save_path (Path, optional): The path to save the exported model.
@@ -90,17 +126,38 @@ def export_model_to_trt(
         input_names (list[str], optional): The names of the input tensors.
         output_names (list[str], optional): The names of the output tensors.
         dynamic_axes (dict[str, dict[int, str]], optional): Dynamic axes for the model.
+        shapes (dict[str, str | None], optional): The min/opt/max shapes of the engine.
+        use_cache (bool): Whether to look up and store the artifact in the export cache.
     """
     if isinstance(model, YOLO):
+        export_options = {
+            "format": "engine",
+            "int8": True,
+            "dynamic": True,
+            "simplify": True,
+        }
+        weights_path = Path(model.ckpt_path)
+        trt_path = weights_path.with_suffix(".engine")
+        if use_cache:
+            # The INT8 engine depends on the calibration set as well
+            key = get_export_key(
+                weights_path,
+                calibration_data=get_file_hash(__get_int8_calibration_archive()),
+                **export_options,
+            )
+            if load_from_cache(key, trt_path):
+                return trt_path
+
         logger.info("Exporting YOLO model to TensorRT format...")
-        path = model.export(
-            format="engine",
-            int8=True,
-            dynamic=True,
-            simplify=True,
-            device="cuda",
-            data=__load_int8_calibration_data(),
-        )
+        # Ultralytics traces and builds the engine in one call, so it holds the lock
+        with _ONNX_EXPORT_LOCK:
+            path = model.export(
+                **export_options,
+                device="cuda",
+                data=__load_int8_calibration_data(),
+            )
+        if use_cache:
+            store_in_cache(key, Path(path))
         return Path(path)
     else:
         if save_path is None:
@@ -114,6 +171,29 @@ def export_model_to_trt(
         if dummy_input is None:
             raise ValueError("Dummy input is required for exporting the model.")
 
+        trt_path = save_path.with_suffix(".engine")
+        key = get_export_key(
+            model,
+            dummy_input,
+            format="engine",
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            shapes=shapes,
+            opset_version=OPSET_VERSION,
+        )
+        if use_cache and load_from_cache(key, trt_path):
+            # Restore the matching ONNX model as well, it is served from the cache too
+            export_model_to_onnx(
+                model,
+                save_path=save_path.with_suffix(".onnx"),
+                dummy_input=dummy_input,
+                input_names=input_names,
+                output_names=output_names,
+                dynamic_axes=dynamic_axes,
+            )
+            return trt_path
+
         # Export the model to ONNX first
         save_path = export_model_to_onnx(
             model,
@@ -122,11 +202,11 @@ def export_model_to_trt(
             input_names=input_names,
             output_names=output_names,
             dynamic_axes=dynamic_axes,
+            use_cache=use_cache,
         )
 
         logger.info("Exporting the model to TensorRT format...")
         onnx_path = save_path.with_suffix(".onnx")
-        trt_path = save_path.with_suffix(".engine")
 
         # Check if ONNX file exists before running trtexec
         if not onnx_path.is_file():
@@ -158,10 +238,9 @@ def export_model_to_trt(
             "--verbose" if IS_DEBUG else "",
         )
 
-        # Run the command
+        # Run the command (without a shell, so all arguments reach trtexec)
         ret = sp.run(
             tuple(c for c in command if c),
-            shell=True,
             check=True,
             capture_output=True,
             text=True,
@@ -169,6 +248,205 @@ def export_model_to_trt(
         if ret.returncode != 0:
             raise RuntimeError(f"trtexec failed with error: {ret.stderr}")
 
+        if use_cache:
+            store_in_cache(key, trt_path)
+
         logger.debug(ret.stdout)
         logger.info(f"TensorRT model exported to '{trt_path}'!")
         return trt_path
+
+
+def quantize_onnx_model(
+    onnx_path: Path,
+    save_path: Optional[Path] = None,
+    calibration_data: Optional[Iterable[dict[str, np.ndarray]]] = None,
+    op_types_to_quantize: Optional[list[str]] = None,
+) -> Path:
+    """
+    Quantize the weights (and activations) of an ONNX model to INT8 for CPU backends.
+    Without calibration data, the model is quantized dynamically, i.e. activations are
+    quantized on the fly. With calibration data, activation ranges are calibrated
+    upfront (static quantization). The model is shape-inferred and optimized first,
+    the quantizer cannot infer the shapes of dynamo exports by itself.
+
+    Args:
+        onnx_path (Path): The path of the FP32 ONNX model.
+        save_path (Path, optional): The path to save the quantized model.
+            Defaults to `<onnx_path>.int8.onnx`.
+        calibration_data (Iterable[dict[str, np.ndarray]], optional): Model inputs used
+            to calibrate the activation ranges.
+        op_types_to_quantize (list[str], optional): The operator types to quantize.
+            Defaults to the linear projections (MatMul and Gemm).
+    """
+    # ONNX Runtime is only required by the CPU tooling, not by the TensorRT export
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class _CalibrationDataReader(CalibrationDataReader):
+        """Feeds calibration samples to the ONNX Runtime static quantizer."""
+
+        def __init__(self, calibration_data: Iterable[dict[str, np.ndarray]]):
+            self._iterator = iter(calibration_data)
+
+        def get_next(self) -> Optional[dict[str, np.ndarray]]:
+            return next(self._iterator, None)
+
+    if not onnx_path.is_file():
+        raise FileNotFoundError(f"ONNX file not found: {onnx_path}")
+
+    save_path = save_path or onnx_path.with_suffix(".int8.onnx")
+    op_types_to_quantize = op_types_to_quantize or ["MatMul", "Gemm"]
+    # The pre-processed model is temporary, so a failure leaves nothing behind
+    with tempfile.TemporaryDirectory() as temp_dir:
+        prep_path = Path(temp_dir, onnx_path.name)
+
+        logger.info("Preprocessing the model for quantization...")
+        quant_pre_process(onnx_path, prep_path)
+
+        if calibration_data is None:
+            logger.info("Quantizing the model dynamically to INT8...")
+            quantize_dynamic(
+                prep_path,
+                save_path,
+                op_types_to_quantize=op_types_to_quantize,
+                weight_type=QuantType.QInt8,
+            )
+        else:
+            logger.info("Quantizing the model statically to INT8...")
+            quantize_static(
+                prep_path,
+                save_path,
+                _CalibrationDataReader(calibration_data),
+                op_types_to_quantize=op_types_to_quantize,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+
+    logger.info(f"Quantized ONNX model exported to '{save_path}'!")
+    return save_path
+
+
+def _benchmark_onnx_session(
+    onnx_path: Path,
+    optimize: bool,
+    sample_inputs: Optional[dict[str, np.ndarray]],
+    iterations: int,
+) -> tuple[float, Optional[float]]:
+    """
+    Measure the session creation time and the mean latency of an ONNX model on the CPU.
+    Args:
+        optimize (bool): Whether the session applies all graph optimizations at load
+            time, instead of running the model as is.
+
+    Returns:
+        tuple[float, Optional[float]]: The startup time and the latency in ms
+            (None without sample inputs).
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = (
+        ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if optimize
+        else ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    )
+
+    start = time.perf_counter()
+    session = ort.InferenceSession(
+        onnx_path.as_posix(), options, providers=["CPUExecutionProvider"]
+    )
+    startup_ms = (time.perf_counter() - start) * 1000
+    if sample_inputs is None:
+        return startup_ms, None
+
+    session.run(None, sample_inputs)  # Warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        session.run(None, sample_inputs)
+    return startup_ms, (time.perf_counter() - start) / iterations * 1000
+
+
+def optimize_onnx_model(
+    onnx_path: Path,
+    save_path: Optional[Path] = None,
+    sample_inputs: Optional[dict[str, np.ndarray]] = None,
+    iterations: int = 100,
+) -> Path:
+    """
+    Optimize an ONNX model offline for CPU backends and write a latency and size report.
+    The model is shape-inferred, constant-folded and slimmed with onnxslim, then the
+    extended graph optimizations of ONNX Runtime are applied and serialized, so they
+    do not have to run again at every startup. Load the result with graph
+    optimizations disabled.
+
+    Args:
+        onnx_path (Path): The path of the exported ONNX model.
+        save_path (Path, optional): The path to save the optimized model.
+            Defaults to `<onnx_path>.opt.onnx`.
+        sample_inputs (dict[str, np.ndarray], optional): A model input used to compare
+            the latency of the original and the optimized model.
+        iterations (int): Number of timed runs for the latency comparison.
+    """
+    import onnx
+    import onnxruntime as ort
+    import onnxslim
+
+    if not onnx_path.is_file():
+        raise FileNotFoundError(f"ONNX file not found: {onnx_path}")
+
+    save_path = save_path or onnx_path.with_suffix(".opt.onnx")
+    slim_path = save_path.with_suffix(".slim.onnx")
+
+    logger.info("Optimizing the ONNX model...")
+    model = onnx.shape_inference.infer_shapes(onnx.load(onnx_path))
+    model = onnxslim.slim(model)
+    onnx.save(model, slim_path)
+
+    # Let ONNX Runtime serialize its extended graph optimizations. Their fused operators
+    # target the CPU execution provider, so the result is only meant for CPU backends
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = save_path.as_posix()
+    ort.InferenceSession(
+        slim_path.as_posix(), options, providers=["CPUExecutionProvider"]
+    )
+    slim_path.unlink()
+
+    original_startup, original_latency = _benchmark_onnx_session(
+        onnx_path,
+        optimize=True,
+        sample_inputs=sample_inputs,
+        iterations=iterations,
+    )
+    optimized_startup, optimized_latency = _benchmark_onnx_session(
+        save_path,
+        optimize=False,
+        sample_inputs=sample_inputs,
+        iterations=iterations,
+    )
+    report = {
+        "size_bytes": {
+            "original": onnx_path.stat().st_size,
+            "optimized": save_path.stat().st_size,
+        },
+        "startup_ms": {
+            "original": original_startup,
+            "optimized": optimized_startup,
+        },
+        "latency_ms": {
+            "original": original_latency,
+            "optimized": optimized_latency,
+        },
+    }
+    report_path = save_path.with_suffix(".json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+    logger.info(f"Optimized ONNX model exported to '{save_path}'!")
+    logger.info(f"Optimization report saved to '{report_path}': {report}")
+    return save_path
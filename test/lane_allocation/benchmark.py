@@ -0,0 +1,129 @@
+# Compare the inference latency of the eager, the compiled and the dense GAT at several graph sizes
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import torch
+
+from ai.lane_allocation import MODULE_CONFIG as GAT_CONFIG
+from ai.lane_allocation import DenseLaneAllocationGAT, LaneAllocationGAT, logger
+from shared_src.data_preprocessing import build_edge_index
+from shared_src.inference import MAX_VEHICLES_PER_LANE, NUM_LANES
+
+DEVICE: torch.device = torch.device("cpu")
+GRAPH_SIZES: tuple[int, ...] = (1, 4, MAX_VEHICLES_PER_LANE, 16, 32, 64, 128, 256)
+
+
+def random_graph(num_nodes: int) -> tuple[torch.Tensor, torch.Tensor]:
+    """Generate a random scene with the given number of vehicles.
+
+    Args:
+        num_nodes (int): Number of vehicles in the scene.
+
+    Returns:
+        tuple: Tuple containing the feature vectors and edge index.
+    """
+    x = torch.randn(num_nodes, 4 + NUM_LANES)
+    x[:, 0] = torch.randint(0, NUM_LANES, (num_nodes,))
+    x[:, 3] = torch.rand(num_nodes) * MAX_VEHICLES_PER_LANE * 10
+    max_distance_cm = GAT_CONFIG.get("vehicle", {}).get("max_distance_cm") or 10
+    edge_index = build_edge_index(x, max_distance=max_distance_cm)
+    return x.to(DEVICE), edge_index.to(DEVICE)
+
+
+def benchmark_forward(
+    forward: Callable, graph: tuple[torch.Tensor, torch.Tensor], iterations: int
+) -> float:
+    """Benchmark a forward function on a single graph.
+
+    Args:
+        forward (Callable): The forward function to benchmark.
+        graph (tuple): The input graph.
+        iterations (int): Number of timed iterations.
+
+    Returns:
+        float: Mean latency in milliseconds.
+    """
+    with torch.no_grad():
+        # Warm up (and compile)
+        for _ in range(3):
+            forward(*graph)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            forward(*graph)
+        return (time.perf_counter() - start) / iterations * 1000
+
+
+def load_model(model_path: Optional[Path]) -> LaneAllocationGAT:
+    """Load the GAT, with random weights if no model path is given.
+
+    Args:
+        model_path (Path, optional): Path to the model checkpoint.
+
+    Returns:
+        LaneAllocationGAT: The loaded model.
+    """
+    model_config = GAT_CONFIG.get("model", {})
+    model = LaneAllocationGAT(
+        input_dim=4 + NUM_LANES,
+        hidden_dim=model_config.get("hidden_dim"),
+        heads=model_config.get("num_heads"),
+    ).to(DEVICE)
+    if model_path is None:
+        return model.eval()
+    return model.inference(model_path, DEVICE)
+
+
+def main(model_path: Optional[Path], iterations: int):
+    torch.manual_seed(GAT_CONFIG.get("environment", {}).get("seed"))
+    model = load_model(model_path)
+    compiled_model = model.compiled()
+    dense_model = DenseLaneAllocationGAT(
+        input_dim=model.input_layer.in_channels,
+        hidden_dim=model.input_layer.out_channels,
+        heads=model.input_layer.heads,
+    ).to(DEVICE)
+    dense_model.load_state_dict(model.state_dict())
+    dense_model.eval()
+
+    logger.info(
+        f"{'Nodes':>6} | {'Eager (ms)':>10} | {'Compiled (ms)':>13} | {'Dense (ms)':>10} | Max abs. error"
+    )
+    for num_nodes in GRAPH_SIZES:
+        graph = random_graph(num_nodes)
+        eager_ms = benchmark_forward(model, graph, iterations)
+        compiled_ms = benchmark_forward(compiled_model, graph, iterations)
+        dense_ms = benchmark_forward(dense_model.forward_dense, graph, iterations)
+        with torch.no_grad():
+            error = (model(*graph) - dense_model.forward_dense(*graph)).abs().max()
+        logger.info(
+            f"{num_nodes:>6} | {eager_ms:>10.3f} | {compiled_ms:>13.3f} | {dense_ms:>10.3f} | {error.item():.2e}"
+        )
+    logger.info(
+        f"Dense path is used up to {dense_model.dense_threshold} nodes (model.dense_threshold)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the eager, the compiled and the dense GAT on the CPU."
+    )
+    parser.add_argument(
+        "-m",
+        "--model-path",
+        type=str,
+        default=None,
+        help="Path to the GAT checkpoint (default: random weights).",
+    )
+    parser.add_argument(
+        "-i",
+        "--iterations",
+        type=int,
+        default=200,
+        help="Number of timed iterations per graph size (default: 200).",
+    )
+    args = parser.parse_args()
+
+    main(Path(args.model_path) if args.model_path else None, args.iterations)
@@ -0,0 +1,57 @@
+# Compare the encode/decode cost and the message size of the wire formats of the command channel
+import argparse
+import timeit
+
+from shared_src.network import WireFormat, decode_message, encode_message, logger
+
+MESSAGES: dict[str, dict] = {
+    "switch": {"command": "switch", "value": (2, 3)},
+    "switch (acked)": {"command": "switch", "value": (2, 3), "seq": 4711},
+    "switch_batch": {
+        "command": "switch_batch",
+        "value": (42, [(0, 1), (2, 1), (3, 2)]),
+    },
+    "ack": {"command": "ack", "value": 4711},
+    "exit": {"command": "exit", "value": None},
+    "generic": {"command": "custom", "value": {"lanes": [0, 1, 2]}},
+}
+
+
+def main(iterations: int):
+    logger.info(
+        f"{'Message':>15} | {'Format':>6} | {'Size (B)':>8} | {'Encode (µs)':>11} | {'Decode (µs)':>11}"
+    )
+    for name, message in MESSAGES.items():
+        for wire_format in WireFormat:
+            payload = encode_message(message, wire_format)
+            encode_us = (
+                timeit.timeit(
+                    lambda: encode_message(message, wire_format), number=iterations
+                )
+                / iterations
+                * 1e6
+            )
+            decode_us = (
+                timeit.timeit(lambda: decode_message(payload), number=iterations)
+                / iterations
+                * 1e6
+            )
+            logger.info(
+                f"{name:>15} | {wire_format.value:>6} | {len(payload):>8} | {encode_us:>11.2f} | {decode_us:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the wire formats of the command channel."
+    )
+    parser.add_argument(
+        "-i",
+        "--iterations",
+        type=int,
+        default=100000,
+        help="Number of timed iterations per message (default: 100000).",
+    )
+    args = parser.parse_args()
+
+    main(args.iterations)
@@ -0,0 +1,62 @@
+# Measure the time-to-peer of the peer discovery on loopback, with and without a cached peer
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from shared_src.network import discover_peer, logger, respond_to_broadcast
+
+
+def discover(port: int, cache_path: Path, responder_delay: float) -> float:
+    """Run a responder that comes up after a delay and return the time-to-peer.
+    A negative delay starts the responder before the discovery.
+    """
+
+    def respond() -> None:
+        time.sleep(max(responder_delay, 0))
+        respond_to_broadcast(port=port, timeout=10, stop_on_response=True)
+
+    responder = threading.Thread(target=respond, daemon=True)
+    responder.start()
+    time.sleep(max(-responder_delay, 0))
+    start = time.perf_counter()
+    # Loopback stands in for the broadcast address of the network
+    peer_ip = discover_peer(
+        port=port, timeout=10, broadcast_ip="127.0.0.1", cache_path=cache_path
+    )
+    elapsed = time.perf_counter() - start
+    responder.join()
+    if peer_ip is None:
+        raise RuntimeError("No peer found")
+    return elapsed
+
+
+def main(port: int, responder_delay: float):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = Path(cache_dir, "last_peer.json")
+        cold = discover(port, cache_path, responder_delay)
+        warm = discover(port, cache_path, -0.2)
+
+    logger.info(
+        f"Time-to-peer, responder up after {responder_delay}s: {cold * 1000:.1f}ms"
+    )
+    logger.info(f"Time-to-peer, cached peer already up: {warm * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the time-to-peer of the peer discovery on loopback."
+    )
+    parser.add_argument(
+        "-p", "--port", type=int, default=5599, help="Port of the discovery responder."
+    )
+    parser.add_argument(
+        "-d",
+        "--responder-delay",
+        type=float,
+        default=1.0,
+        help="Seconds until the responder comes up in the cold run.",
+    )
+    args = parser.parse_args()
+    main(args.port, args.responder_delay)
@@ -0,0 +1,154 @@
+# Measure how many concurrent viewers the display server sustains, with local HTTP clients
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from shared_src.network import logger
+from shared_src.network.metrics import LatencyHistogram
+
+DIRECTIONS: tuple[str, ...] = ("left", "right", "straight")
+
+
+async def view(
+    session: aiohttp.ClientSession,
+    url: str,
+    arrivals: list[float],
+    ready: asyncio.Event,
+) -> None:
+    """Read a display stream and record the arrival time of each frame."""
+    async with session.get(f"{url}/live_display") as response:
+        ready.set()
+        while True:
+            await response.content.readuntil(b"--frame")
+            arrivals.append(time.perf_counter())
+
+
+async def run_step(
+    url: str, num_viewers: int, num_changes: int, interval: float, deadline: float
+) -> tuple[float, LatencyHistogram]:
+    """
+    Connect the viewers, change the direction a number of times and measure
+    how many viewers receive each change in time.
+
+    Returns:
+        tuple[float, LatencyHistogram]: The fraction of delivered changes and their latency.
+    """
+    latency = LatencyHistogram(f"{num_viewers} viewers")
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        arrivals = [[] for _ in range(num_viewers)]
+        ready = [asyncio.Event() for _ in range(num_viewers)]
+        viewers = [
+            asyncio.create_task(view(session, url, arrivals[i], ready[i]))
+            for i in range(num_viewers)
+        ]
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in ready)), 30)
+        # Start from a known direction, so every measured change is an actual change
+        async with session.get(f"{url}/set_direction/{DIRECTIONS[-1]}") as response:
+            response.raise_for_status()
+        await asyncio.sleep(interval)
+
+        delivered = 0
+        for change in range(num_changes):
+            direction = DIRECTIONS[change % len(DIRECTIONS)]
+            changed_at = time.perf_counter()
+            async with session.get(f"{url}/set_direction/{direction}") as response:
+                response.raise_for_status()
+            await asyncio.sleep(interval)
+            for viewer_arrivals in arrivals:
+                first = next((t for t in viewer_arrivals if t >= changed_at), None)
+                if first is not None and first - changed_at <= deadline:
+                    latency.record(first - changed_at)
+                    delivered += 1
+                viewer_arrivals.clear()
+
+        for viewer in viewers:
+            viewer.cancel()
+        await asyncio.gather(*viewers, return_exceptions=True)
+    return delivered / (num_viewers * num_changes), latency
+
+
+async def main(
+    url: str,
+    steps: list[int],
+    num_changes: int,
+    interval: float,
+    deadline: float,
+    min_delivery: float,
+):
+    sustained = 0
+    for num_viewers in steps:
+        try:
+            delivery, latency = await run_step(
+                url, num_viewers, num_changes, interval, deadline
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"{num_viewers} viewers: failed to connect ({e!r})")
+            break
+        logger.info(f"{latency.summary()}, delivered={delivery * 100:.1f}%")
+        if delivery < min_delivery:
+            break
+        sustained = num_viewers
+
+    logger.info(
+        f"Sustained {sustained} viewers with {min_delivery * 100:.0f}% of the changes "
+        f"delivered within {deadline * 1000:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load-test the live display of a running display server."
+    )
+    parser.add_argument(
+        "--url",
+        type=str,
+        default="http://127.0.0.1:8000",
+        help="Base URL of the display server.",
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        nargs="+",
+        default=[10, 50, 100, 200, 400, 800],
+        help="Numbers of concurrent viewers to test, in order.",
+    )
+    parser.add_argument(
+        "-n",
+        "--num-changes",
+        type=int,
+        default=10,
+        help="Direction changes per step.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Seconds between direction changes.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=0.2,
+        help="Seconds within which a change counts as delivered.",
+    )
+    parser.add_argument(
+        "--min-delivery",
+        type=float,
+        default=0.99,
+        help="Fraction of changes that must be delivered to sustain a step.",
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            args.url,
+            args.steps,
+            args.num_changes,
+            args.interval,
+            args.deadline,
+            args.min_delivery,
+        )
+    )
@@ -0,0 +1,91 @@
+# Measure the command latency and the idle CPU usage of the ServerClient channel on loopback
+import argparse
+import time
+
+from shared_src.network import ChannelMode, ServerClient, logger
+from shared_src.network.metrics import LatencyHistogram
+
+
+def main(mode: ChannelMode, port: int, num_commands: int, rate: float, idle_sec: float):
+    latency = LatencyHistogram("command latency")
+    received = 0
+
+    def on_event(command: str, value: float) -> None:
+        nonlocal received
+        # Both ends run in this process, so they share the clock
+        latency.record(time.perf_counter() - value)
+        received += 1
+
+    server = ServerClient(port, mode=mode, daemon=True)
+    server.add_listener(on_event)
+    client = ServerClient(
+        port, is_server=False, server_ip="127.0.0.1", mode=mode, daemon=True
+    )
+    server.start()
+    client.start()
+    time.sleep(0.5)  # Let the peers connect
+
+    # Idle CPU usage, the channel threads should sleep while there is no traffic
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    time.sleep(idle_sec)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+    for _ in range(num_commands):
+        client.send("switch", time.perf_counter())
+        time.sleep(1 / rate)
+
+    deadline = time.perf_counter() + 2
+    while received < num_commands and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+    logger.info(f"Mode: {mode.value}, received {received}/{num_commands} commands")
+    logger.info(f"Idle CPU usage: {idle_cpu * 100:.1f}% of a core")
+    logger.info(latency.summary())
+    logger.info(client.metrics.send_latency.summary())
+    logger.info(client.metrics.round_trip.summary())
+    logger.info(server.metrics.one_way_latency.summary())
+    logger.info(server.metrics.dispatch_latency.summary())
+
+    client.dispose()
+    server.dispose()
+    client.join()
+    server.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ServerClient command channel on loopback."
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default=ChannelMode.DEALER_ROUTER.value,
+        choices=[m.value for m in ChannelMode],
+        help="Messaging pattern of the channel (default: dealer_router).",
+    )
+    parser.add_argument(
+        "-p", "--port", type=int, default=5599, help="Loopback port (default: 5599)."
+    )
+    parser.add_argument(
+        "-n",
+        "--num-commands",
+        type=int,
+        default=1000,
+        help="Number of commands to send (default: 1000).",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        default=200,
+        help="Commands per second (default: 200).",
+    )
+    parser.add_argument(
+        "--idle-sec",
+        type=float,
+        default=2,
+        help="Duration of the idle CPU measurement in seconds (default: 2).",
+    )
+    args = parser.parse_args()
+
+    main(ChannelMode(args.mode), args.port, args.num_commands, args.rate, args.idle_sec)